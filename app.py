@@ -1,18 +1,31 @@
 from flask import (
     Flask, render_template, request, redirect, url_for, 
-    flash, send_from_directory, session, Response, jsonify, send_file
+    flash, send_from_directory, session, Response, jsonify, send_file,
+    g, has_app_context, has_request_context, stream_with_context
 )
 from werkzeug.utils import secure_filename
 
 import sqlite3
 import os
+import queue
+import threading
+import itertools
+import time
+import uuid
+import hashlib
+import json
+import click
 import qrcode
 import requests
 import numpy as np
 import io
 import csv
-import pandas as pd
-from PIL import Image, ImageDraw, ImageFont
+import tempfile
+import xlsxwriter
+from PIL import Image, ImageDraw, ImageFont, ImageOps, features
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 from datetime import datetime
 from dateutil import parser
 # import cv2  # Uncomment if needed
@@ -25,21 +38,273 @@ app = Flask(__name__)
 app.secret_key = 'supersecretkey'
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif'}
+app.config['DATABASE'] = 'database/database.db'
+app.config['DB_POOL_SIZE'] = 8
+app.config['DB_BUSY_TIMEOUT_MS'] = 5000
+app.config['DB_MMAP_SIZE'] = 64 * 1024 * 1024
+app.config['DB_SYNCHRONOUS'] = 'NORMAL'
+app.config['STUDENT_CACHE_SIZE'] = 5000
+app.config['IMPORT_CHUNK_SIZE'] = 500
+app.config['QR_FOLDER'] = 'static/qrcodes'
+app.config['QR_WORKERS'] = os.cpu_count() or 1
+app.config['IMPORT_FOLDER'] = 'database/imports'
+app.config['QR_CACHE_SIZE'] = 512
+app.config['QR_MAX_AGE'] = 7 * 24 * 60 * 60
+app.config['PAGE_SIZE'] = 50
+app.config['PAGE_SIZE_MAX'] = 200
+app.config['LIVE_FEED_SIZE'] = 200
+app.config['LIVE_FEED_KEEPALIVE'] = 15
+app.config['SCAN_BATCH_MAX'] = 500
+app.config['DECODE_WORKERS'] = os.cpu_count() or 1
+app.config['DECODE_MAX_SIDE'] = 1280
+app.config['DECODE_BATCH_MAX'] = 50
+app.config['LATENESS_THRESHOLDS'] = (0, 15, 30)
+app.config['SCAN_OPENS_BEFORE_START'] = 60
+app.config['SCAN_CLOSES_AFTER_END'] = 60
+app.config['METRICS_ALLOW_REMOTE'] = False
+app.config['THUMBNAIL_FOLDER'] = 'static/uploads/thumbs'
+app.config['THUMBNAIL_SIZES'] = {'small': 96, 'card': 200, 'profile': 400}
+app.config['THUMBNAIL_WORKERS'] = 2
+app.config['THUMBNAIL_MAX_AGE'] = 365 * 24 * 60 * 60
+app.config['SCAN_WRITER_ENABLED'] = False
+app.config['SCAN_WRITER_BATCH_MAX'] = 64
+app.config['SCAN_WRITER_FLUSH_MS'] = 5
+app.config['SCAN_WRITER_SYNCHRONOUS'] = 'NORMAL'
+app.config['SCAN_WRITER_TIMEOUT'] = 10
+app.config['SCAN_DEBOUNCE_SECONDS'] = 10
+app.config['AUTO_CHECKOUT_ENABLED'] = True
+app.config['AUTO_CHECKOUT_STATUS'] = 'Auto Checked Out'
+app.config['AUTO_CHECKOUT_INTERVAL'] = 60
+app.config['ARCHIVE_FOLDER'] = 'database/archive'
+app.config['ARCHIVE_AFTER_DAYS'] = 30
+app.config['ARCHIVE_ATTACH_MAX'] = 4
 
 if not os.path.exists('database'):
     os.makedirs('database')
 if not os.path.exists(app.config['UPLOAD_FOLDER']):
     os.makedirs(app.config['UPLOAD_FOLDER'])
-if not os.path.exists('static/qrcodes'):
-    os.makedirs('static/qrcodes')
+if not os.path.exists(app.config['QR_FOLDER']):
+    os.makedirs(app.config['QR_FOLDER'])
+
+# In-process metrics for /metrics (Prometheus text format). Histograms are
+# keyed by (name, labels) and hold cumulative bucket counts, sum and count.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+METRIC_HELP = {
+    'attendance_request_duration_seconds': ('histogram', 'Request latency by Flask endpoint.'),
+    'attendance_request_db_seconds': ('histogram', 'Time spent in SQLite execute, fetch and commit calls per request.'),
+    'attendance_qr_render_seconds': ('histogram', 'Time to render one QR code image.'),
+    'attendance_db_connections_opened_total': ('counter', 'New SQLite connections opened because the pool was empty, by endpoint.'),
+    'attendance_scan_writer_batch_size': ('histogram', 'Scans applied per group commit by the scan writer.'),
+    'attendance_scan_writer_commits_total': ('counter', 'Group commits made by the scan writer.'),
+    'attendance_scan_writer_scans_total': ('counter', 'Scans applied by the scan writer.'),
+    'attendance_scans_debounced_total': ('counter', 'Repeat scans answered from the debounce window.'),
+    'attendance_cache_requests_total': ('counter', 'Cache lookups by cache and result.'),
+    'attendance_cache_hit_ratio': ('gauge', 'Cache hits over lookups since start.'),
+    'attendance_archive_attach_total': ('counter', 'Archive files attached to pooled connections for reads.'),
+}
+
+_metrics_lock = threading.Lock()
+_histograms = {}
+_counters = Counter()
+
+def observe_metric(name, value, buckets=LATENCY_BUCKETS, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                histogram["counts"][i] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+def increment_metric(name, amount=1, **labels):
+    with _metrics_lock:
+        _counters[(name, tuple(sorted(labels.items())))] += amount
+
+def record_cache_lookup(cache, hit):
+    increment_metric('attendance_cache_requests_total', cache=cache, result='hit' if hit else 'miss')
+
+def add_request_db_time(seconds):
+    if has_app_context():
+        g.db_seconds = g.get('db_seconds', 0.0) + seconds
+
+def format_metric_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels) + '}'
+
+def render_metrics():
+    with _metrics_lock:
+        histograms = {key: dict(value, counts=list(value["counts"])) for key, value in _histograms.items()}
+        counters = dict(_counters)
+
+    # Hit ratio per cache, derived from the lookup counters
+    lookups = Counter()
+    hits = Counter()
+    for (name, labels), value in counters.items():
+        if name == 'attendance_cache_requests_total':
+            labels = dict(labels)
+            lookups[labels['cache']] += value
+            if labels['result'] == 'hit':
+                hits[labels['cache']] += value
+    gauges = {('attendance_cache_hit_ratio', (('cache', cache),)): hits[cache] / total
+              for cache, total in lookups.items() if total}
+
+    lines = []
+    for metric, (metric_type, help_text) in METRIC_HELP.items():
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {metric_type}")
+        if metric_type == 'histogram':
+            for (name, labels), histogram in sorted(histograms.items()):
+                if name != metric:
+                    continue
+                for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                    lines.append(f"{name}_bucket{format_metric_labels(labels + (('le', bound),))} {count}")
+                lines.append(f"{name}_bucket{format_metric_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+                lines.append(f"{name}_sum{format_metric_labels(labels)} {histogram['sum']}")
+                lines.append(f"{name}_count{format_metric_labels(labels)} {histogram['count']}")
+        else:
+            values = counters if metric_type == 'counter' else gauges
+            for (name, labels), value in sorted(values.items()):
+                if name == metric:
+                    lines.append(f"{name}{format_metric_labels(labels)} {value}")
+    return '\n'.join(lines) + '\n'
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, *args):
+        started = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            add_request_db_time(time.perf_counter() - started)
 
-def get_db_connection():
-    conn = sqlite3.connect('database/database.db')
+    def executemany(self, *args):
+        started = time.perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            add_request_db_time(time.perf_counter() - started)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            add_request_db_time(time.perf_counter() - started)
+
+    def fetchmany(self, *args):
+        started = time.perf_counter()
+        try:
+            return super().fetchmany(*args)
+        finally:
+            add_request_db_time(time.perf_counter() - started)
+
+    def fetchall(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            add_request_db_time(time.perf_counter() - started)
+
+class PooledConnection(sqlite3.Connection):
+    # Routes call close() when they are done; that hands the connection back
+    # to the pool instead of tearing it down.
+    def close(self):
+        release_db_connection(self)
+
+    # Route every statement through TimedCursor so DB time is counted per request
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            add_request_db_time(time.perf_counter() - started)
+
+
+_db_pool = queue.LifoQueue(maxsize=app.config['DB_POOL_SIZE'])
+
+SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+def sqlite_synchronous(level):
+    level = str(level).upper()
+    if level not in SYNCHRONOUS_LEVELS:
+        raise ValueError(f"Unknown synchronous level: {level}")
+    return level
+
+def open_db_connection():
+    conn = sqlite3.connect(app.config['DATABASE'], factory=PooledConnection, check_same_thread=False)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA foreign_keys = ON;")
+    conn.execute(f"PRAGMA synchronous = {sqlite_synchronous(app.config['DB_SYNCHRONOUS'])};")
+    conn.execute(f"PRAGMA busy_timeout = {int(app.config['DB_BUSY_TIMEOUT_MS'])};")
+    conn.execute(f"PRAGMA mmap_size = {int(app.config['DB_MMAP_SIZE'])};")
     return conn
 
+def get_db_connection():
+    if has_app_context() and 'db' in g:
+        return g.db
+
+    try:
+        conn = _db_pool.get_nowait()
+    except queue.Empty:
+        conn = open_db_connection()
+        # Startup, CLI commands and the background threads count as 'background'
+        endpoint = (request.endpoint or 'unmatched') if has_request_context() else 'background'
+        increment_metric('attendance_db_connections_opened_total', endpoint=endpoint)
+
+    if has_app_context():
+        g.db = conn
+    return conn
+
+def release_db_connection(conn):
+    if has_app_context() and g.get('db') is conn:
+        # Still in use by the current request, released on teardown
+        return
+    if conn.in_transaction:
+        conn.rollback()
+    try:
+        _db_pool.put_nowait(conn)
+    except queue.Full:
+        sqlite3.Connection.close(conn)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.db_seconds = 0.0
+
+# Runs after streamed responses finish, so exports are timed end to end
+@app.teardown_request
+def record_request_metrics(exception):
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    endpoint = request.endpoint or 'unmatched'
+    observe_metric('attendance_request_duration_seconds', time.perf_counter() - started, endpoint=endpoint)
+    observe_metric('attendance_request_db_seconds', g.get('db_seconds', 0.0), endpoint=endpoint)
+
+@app.teardown_appcontext
+def close_db_connection(exception):
+    conn = g.pop('db', None)
+    if conn is not None:
+        release_db_connection(conn)
+
 conn = get_db_connection()
+# WAL lets scanner writes and dashboard reads run side by side; the setting is
+# stored in the database file so it only needs to happen once.
+conn.execute("PRAGMA journal_mode = WAL;")
 c = conn.cursor()
 
 # Create students_tbl
@@ -104,6 +369,166 @@ c.execute('''CREATE TABLE IF NOT EXISTS attendance_list_tbl (
     FOREIGN KEY (activity_id) REFERENCES activity_tbl(id)
 )''')
 
+# Create import_job_tbl
+c.execute('''CREATE TABLE IF NOT EXISTS import_job_tbl (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    filename TEXT NOT NULL,
+    status TEXT NOT NULL,
+    rows_processed INTEGER NOT NULL DEFAULT 0,
+    inserted INTEGER NOT NULL DEFAULT 0,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    qrcodes_done INTEGER NOT NULL DEFAULT 0,
+    qrcodes_total INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    finished_at TEXT,
+    created_by INTEGER,
+    FOREIGN KEY (created_by) REFERENCES admin_tbl(id)
+)''')
+
+# Jobs that were still queued or running when the process stopped will never finish
+c.execute('''UPDATE import_job_tbl SET status = 'failed', error = 'Interrupted by restart', finished_at = datetime('now')
+             WHERE status NOT IN ('done', 'failed')''')
+
+# Schema migrations, applied in order on top of the tables above.
+# PRAGMA user_version records the last one applied to the database file.
+MIGRATIONS = [
+    # 1: a student can only have one open (not yet checked out) row per activity.
+    # Older databases may hold duplicates left by concurrent scans, keep the first.
+    [
+        '''DELETE FROM attendance_list_tbl
+           WHERE time_out_status = 'Not Checked Out' AND id NOT IN (
+               SELECT MIN(id) FROM attendance_list_tbl
+               WHERE time_out_status = 'Not Checked Out'
+               GROUP BY student_usn, activity_id, event_type
+           )''',
+        '''CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_open
+           ON attendance_list_tbl (student_usn, activity_id, event_type)
+           WHERE time_out_status = 'Not Checked Out'
+        ''',
+    ],
+    # 2: indexes for the attendance lookups done by the scan, list and export routes
+    [
+        '''CREATE INDEX IF NOT EXISTS idx_attendance_student
+           ON attendance_list_tbl (student_usn, activity_id, event_type)''',
+        '''CREATE INDEX IF NOT EXISTS idx_attendance_event_activity
+           ON attendance_list_tbl (event_type, activity_id)''',
+        '''CREATE INDEX IF NOT EXISTS idx_activity_event_type
+           ON activity_tbl (event_type)''',
+        '''CREATE INDEX IF NOT EXISTS idx_event_type_event_type
+           ON event_type_tbl (event_type)''',
+    ],
+    # 3: per-activity attendance counts, kept up to date by the scan routes
+    [
+        '''CREATE TABLE IF NOT EXISTS attendance_stats_tbl (
+               activity_id INTEGER NOT NULL,
+               status_type TEXT NOT NULL,
+               status TEXT NOT NULL,
+               total INTEGER NOT NULL DEFAULT 0,
+               PRIMARY KEY (activity_id, status_type, status),
+               FOREIGN KEY (activity_id) REFERENCES activity_tbl(id)
+           )''',
+        '''INSERT OR REPLACE INTO attendance_stats_tbl (activity_id, status_type, status, total)
+           SELECT activity_id, 'time_in', time_in_status, COUNT(*)
+           FROM attendance_list_tbl GROUP BY activity_id, time_in_status''',
+        '''INSERT OR REPLACE INTO attendance_stats_tbl (activity_id, status_type, status, total)
+           SELECT activity_id, 'time_out', time_out_status, COUNT(*)
+           FROM attendance_list_tbl GROUP BY activity_id, time_out_status''',
+    ],
+    # 4: per-activity lateness thresholds in minutes ("0,15,30"), NULL uses LATENESS_THRESHOLDS
+    [
+        '''ALTER TABLE activity_tbl ADD COLUMN lateness_thresholds TEXT''',
+    ],
+    # 5: epoch seconds next to the free-form TEXT datetimes. time_out_at stays NULL
+    # until checkout. The TEXT columns are kept (and still written) so older
+    # processes keep working while this one rolls out; SQLite's 'utc' modifier
+    # reads them as local time, which is how they were written.
+    [
+        '''ALTER TABLE attendance_list_tbl ADD COLUMN time_in_at INTEGER''',
+        '''ALTER TABLE attendance_list_tbl ADD COLUMN time_out_at INTEGER''',
+        '''ALTER TABLE activity_tbl ADD COLUMN start_at INTEGER''',
+        '''ALTER TABLE activity_tbl ADD COLUMN end_at INTEGER''',
+        '''UPDATE attendance_list_tbl SET
+               time_in_at = CAST(strftime('%s', time_in_date_and_time, 'utc') AS INTEGER),
+               time_out_at = CASE WHEN time_out_status = 'Not Checked Out' THEN NULL
+                                  ELSE CAST(strftime('%s', time_out_date_and_time, 'utc') AS INTEGER) END''',
+        '''UPDATE activity_tbl SET
+               start_at = CAST(strftime('%s', start_datetime, 'utc') AS INTEGER),
+               end_at = CAST(strftime('%s', end_datetime, 'utc') AS INTEGER)''',
+        '''CREATE INDEX IF NOT EXISTS idx_attendance_activity_time_in
+           ON attendance_list_tbl (activity_id, time_in_at)''',
+    ],
+    # 6: roster version for /roster delta updates. Every change to students_tbl
+    # bumps the single counter and stamps the changed rows with the new value.
+    [
+        '''CREATE TABLE IF NOT EXISTS roster_meta_tbl (
+               id INTEGER PRIMARY KEY CHECK (id = 1),
+               version INTEGER NOT NULL
+           )''',
+        '''INSERT OR IGNORE INTO roster_meta_tbl (id, version) VALUES (1, 1)''',
+        '''ALTER TABLE students_tbl ADD COLUMN roster_version INTEGER NOT NULL DEFAULT 1''',
+        '''CREATE INDEX IF NOT EXISTS idx_students_roster_version
+           ON students_tbl (roster_version)''',
+    ],
+    # 7: events whose attendance rows were moved to a per-term archive file
+    # (ARCHIVE_FOLDER/<term>.db) by `flask archive-events`
+    [
+        '''CREATE TABLE IF NOT EXISTS archived_event_tbl (
+               event_id INTEGER PRIMARY KEY,
+               term TEXT NOT NULL,
+               row_count INTEGER NOT NULL,
+               archived_at TEXT NOT NULL,
+               FOREIGN KEY (event_id) REFERENCES event_type_tbl(id)
+           )''',
+    ],
+    # 8: time-in/out status as a small integer into attendance_status_tbl.
+    # Statuses are open-ended ("45 mins late" from custom thresholds, checkout
+    # statuses sent by stations), so new ones are added on first use.
+    [
+        '''CREATE TABLE IF NOT EXISTS attendance_status_tbl (
+               id INTEGER PRIMARY KEY,
+               status TEXT NOT NULL UNIQUE
+           )''',
+        '''INSERT OR IGNORE INTO attendance_status_tbl (status) VALUES
+               ('On Time'), ('15 mins late'), ('30 mins late'), ('LATE'),
+               ('Not Checked Out'), ('Checked Out'), ('Auto Checked Out')''',
+        '''INSERT OR IGNORE INTO attendance_status_tbl (status)
+           SELECT time_in_status FROM attendance_list_tbl
+           UNION SELECT time_out_status FROM attendance_list_tbl''',
+        '''ALTER TABLE attendance_list_tbl ADD COLUMN time_in_status_id INTEGER
+           REFERENCES attendance_status_tbl(id)''',
+        '''ALTER TABLE attendance_list_tbl ADD COLUMN time_out_status_id INTEGER
+           REFERENCES attendance_status_tbl(id)''',
+        '''UPDATE attendance_list_tbl SET
+               time_in_status_id = (SELECT id FROM attendance_status_tbl WHERE status = time_in_status),
+               time_out_status_id = (SELECT id FROM attendance_status_tbl WHERE status = time_out_status)''',
+    ],
+    # 9: auto-checkout finds ended activities by end time
+    [
+        '''CREATE INDEX IF NOT EXISTS idx_activity_end_at
+           ON activity_tbl (end_at)''',
+    ],
+]
+
+conn.commit()
+for version, statements in enumerate(MIGRATIONS, start=1):
+    if version <= c.execute("PRAGMA user_version").fetchone()[0]:
+        continue
+    # Workers started together race here: re-read the version under the write
+    # lock so a migration another process just applied is not run twice
+    c.execute("BEGIN IMMEDIATE")
+    if version <= c.execute("PRAGMA user_version").fetchone()[0]:
+        conn.rollback()
+        continue
+    for statement in statements:
+        c.execute(statement)
+    c.execute(f"PRAGMA user_version = {version}")
+    conn.commit()
+
+# attendance_status_tbl ids by status as of startup. Statuses added later are
+# looked up every time: an id cached from a transaction that then rolls back
+# could be handed to a different status.
+_status_ids = dict(c.execute("SELECT status, id FROM attendance_status_tbl").fetchall())
 
 conn.commit()
 conn.close()
@@ -111,23 +536,210 @@ conn.close()
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
-def generate_qr_code(usn):
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(usn)
-    qr.make(fit=True)
-    img = qr.make_image(fill='black', back_color='white')
-    img.save(f'static/qrcodes/{usn}.png')
+# Profile pictures are shown from square thumbnails made in the background
+# after upload. Uploads are stored under a content-hashed name, so a
+# thumbnail never changes once written and can be cached indefinitely.
+THUMBNAIL_FORMAT = 'WEBP' if features.check('webp') else 'JPEG'
+THUMBNAIL_EXTENSION = 'webp' if THUMBNAIL_FORMAT == 'WEBP' else 'jpg'
+
+def thumbnail_name(filename, size):
+    return f"{os.path.splitext(filename)[0]}-{size}.{THUMBNAIL_EXTENSION}"
+
+# URL of a profile picture thumbnail, or of the original upload while the
+# thumbnail has not been made yet
+@app.template_global()
+def thumbnail_url(filename, size='card'):
+    filename = filename or 'default_profile.jpg'
+    name = thumbnail_name(filename, size)
+    if os.path.exists(os.path.join(app.config['THUMBNAIL_FOLDER'], name)):
+        return url_for('profile_thumbnail', filename=name)
+    return url_for('static', filename=f"uploads/{filename}")
+
+# Write every THUMBNAIL_SIZES variant of an upload, with EXIF orientation applied
+def make_thumbnails(filename, overwrite=False):
+    folder = app.config['THUMBNAIL_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    sizes = {name: size for name, size in app.config['THUMBNAIL_SIZES'].items()
+             if overwrite or not os.path.exists(os.path.join(folder, thumbnail_name(filename, name)))}
+    if not sizes:
+        return 0
+
+    with Image.open(os.path.join(app.config['UPLOAD_FOLDER'], filename)) as img:
+        # Let the JPEG decoder scale down while reading; phone photos are ~12 MP
+        largest = max(sizes.values())
+        img.draft('RGB', (largest, largest))
+        img = ImageOps.exif_transpose(img).convert('RGB')
+
+        for name, size in sizes.items():
+            path = os.path.join(folder, thumbnail_name(filename, name))
+            thumbnail = ImageOps.fit(img, (size, size), Image.LANCZOS)
+            # Write then rename so a half-written file is never served
+            thumbnail.save(path + '.tmp', THUMBNAIL_FORMAT, quality=80)
+            os.replace(path + '.tmp', path)
+    return len(sizes)
+
+_thumbnail_executor = ThreadPoolExecutor(max_workers=app.config['THUMBNAIL_WORKERS'])
+
+def run_thumbnail_job(filename, usn=None):
+    try:
+        make_thumbnails(filename)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        app.logger.warning("Could not make thumbnails for %s: %s", filename, e)
+        return
+    if usn is not None:
+        # The cached card and synced rosters still point at the full-size upload
+        invalidate_student_card(usn)
+        conn = get_db_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            bump_roster_version(conn, [usn])
+            conn.commit()
+        finally:
+            conn.close()
+
+def queue_thumbnails(filename, usn=None):
+    _thumbnail_executor.submit(run_thumbnail_job, filename, usn)
+
+@app.route('/thumbs/<filename>')
+def profile_thumbnail(filename):
+    # Thumbnails are written relative to the working directory, not the app root
+    response = send_from_directory(os.path.abspath(app.config['THUMBNAIL_FOLDER']), filename,
+                                   max_age=app.config['THUMBNAIL_MAX_AGE'])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+# Student card payloads served by /verify_student, keyed by USN (LRU)
+_student_cache = OrderedDict()
+_student_cache_lock = threading.Lock()
+
+def build_student_card(student):
+    profile_picture = thumbnail_url(student['profile_picture'], 'card')
+
+    return {
+        "fullname": f"{student['lastname']} {student['firstname']} {student['middlename']}",
+        "course": student['course'],
+        "year": student['year'],
+        "usn": student['usn'],
+        "profile_picture": profile_picture
+    }
+
+def cache_student_card(card):
+    with _student_cache_lock:
+        _student_cache[card['usn']] = card
+        _student_cache.move_to_end(card['usn'])
+        while len(_student_cache) > app.config['STUDENT_CACHE_SIZE']:
+            _student_cache.popitem(last=False)
+
+def get_student_card(usn):
+    with _student_cache_lock:
+        card = _student_cache.get(usn)
+        if card is not None:
+            _student_cache.move_to_end(usn)
+    record_cache_lookup('student', card is not None)
+    if card is not None:
+        return card
+
+    conn = get_db_connection()
+    student = conn.execute("SELECT * FROM students_tbl WHERE usn = ?", (usn,)).fetchone()
+    conn.close()
+
+    if student is None:
+        return None
+
+    card = build_student_card(student)
+    cache_student_card(card)
+    return card
+
+def invalidate_student_card(usn=None):
+    with _student_cache_lock:
+        if usn is None:
+            _student_cache.clear()
+        else:
+            _student_cache.pop(usn, None)
+
+# Epoch seconds for a form datetime ("2025-04-14T08:00" or "2025-04-14 08:00"), read as local time
+def epoch_seconds(value):
+    if not value:
+        return None
+    if not isinstance(value, datetime):
+        value = parser.parse(value)
+    return int(value.timestamp())
+
+# Parse "0,15,30" style lateness thresholds (minutes after start). Empty means
+# use the LATENESS_THRESHOLDS default; raises ValueError on anything else.
+def parse_lateness_thresholds(value):
+    if value is None or not str(value).strip():
+        return None
+    thresholds = sorted(int(part) for part in str(value).split(',') if part.strip())
+    if not thresholds or thresholds[0] < 0:
+        raise ValueError("Lateness thresholds must be non-negative minutes")
+    return thresholds
+
+def format_lateness_thresholds(value):
+    thresholds = parse_lateness_thresholds(value)
+    return ','.join(str(minutes) for minutes in thresholds) if thresholds else None
+
+# Parsed start/end epochs and lateness thresholds per activity, so the scan
+# path does not run dateutil on every request. Cleared when activities change.
+_activity_timing_cache = {}
+_activity_timing_cache_lock = threading.Lock()
+
+def get_activity_timing(conn, activity_id):
+    activity_id = int(activity_id)
+    with _activity_timing_cache_lock:
+        timing = _activity_timing_cache.get(activity_id)
+    record_cache_lookup('activity_timing', timing is not None)
+    if timing is not None:
+        return timing
+
+    row = conn.execute("""SELECT start_datetime, end_datetime, start_at, end_at, lateness_thresholds
+                          FROM activity_tbl WHERE id = ?""", (activity_id,)).fetchone()
+    if row is None:
+        return None
+
+    try:
+        thresholds = parse_lateness_thresholds(row["lateness_thresholds"])
+    except ValueError:
+        thresholds = None
+    timing = {
+        "start": row["start_at"] if row["start_at"] is not None else parser.parse(row["start_datetime"]).timestamp(),
+        "end": row["end_at"] if row["end_at"] is not None else
+               parser.parse(row["end_datetime"]).timestamp() if row["end_datetime"] else None,
+        "thresholds": tuple(thresholds or app.config['LATENESS_THRESHOLDS'])
+    }
+    with _activity_timing_cache_lock:
+        _activity_timing_cache[activity_id] = timing
+    return timing
+
+def invalidate_activity_timing(activity_id=None):
+    with _activity_timing_cache_lock:
+        if activity_id is None:
+            _activity_timing_cache.clear()
+        else:
+            _activity_timing_cache.pop(int(activity_id), None)
+
+# Call inside the transaction that changed these students
+def bump_roster_version(conn, usns):
+    version = conn.execute("UPDATE roster_meta_tbl SET version = version + 1 RETURNING version").fetchone()[0]
+    conn.executemany("UPDATE students_tbl SET roster_version = ? WHERE usn = ?", ((version, usn) for usn in usns))
+    return version
+
+def warm_student_cache():
+    conn = get_db_connection()
+    students = conn.execute("SELECT * FROM students_tbl ORDER BY id DESC LIMIT ?",
+                            (app.config['STUDENT_CACHE_SIZE'],)).fetchall()
+    conn.close()
+
+    # url_for needs a request context to build the static URLs
+    with app.test_request_context():
+        for student in reversed(students):
+            cache_student_card(build_student_card(student))
 
+warm_student_cache()
 
 @app.route('/admin')
 def admin_index():
-    print("Session Data:", session)
-
     if 'admin_id' in session and session['admin_id']:
         return redirect(url_for('admin_dashboard'))
     
@@ -189,27 +801,94 @@ def admin_dashboard():
         flash('You need to log in to access this page!', 'error')
         return redirect(url_for('admin_login'))
 
+    # Students and activities are fetched page by page from the JSON endpoints below
+    return render_template('admin_dashboard.html')
+
+# Read a page size from the query string, clamped to PAGE_SIZE_MAX
+def get_page_size():
+    limit = request.args.get('limit', app.config['PAGE_SIZE'], type=int)
+    return max(1, min(limit, app.config['PAGE_SIZE_MAX']))
+
+@app.route('/admin/api/students')
+def admin_students_page():
+    if 'admin_id' not in session:
+        return jsonify({"error": "Login required"}), 401
+
+    search = request.args.get('q', '').strip()
+    course = request.args.get('course', '').strip()
+    year = request.args.get('year', '').strip()
+    after = request.args.get('after', '')
+    limit = get_page_size()
+
+    query = "SELECT usn, lastname, firstname, middlename, course, year FROM students_tbl WHERE usn > ?"
+    params = [after]
+
+    if search:
+        query += " AND (usn LIKE ? OR lastname LIKE ? OR firstname LIKE ? OR middlename LIKE ? OR course LIKE ?)"
+        params += [f"%{search}%"] * 5
+    if course:
+        query += " AND course = ?"
+        params.append(course)
+    if year:
+        query += " AND year = ?"
+        params.append(year)
+
+    # Fetch one extra row to know whether there is a next page
+    query += " ORDER BY usn LIMIT ?"
+    params.append(limit + 1)
+
     conn = get_db_connection()
+    rows = conn.execute(query, params).fetchall()
+    conn.close()
+
+    students = [dict(row) for row in rows[:limit]]
+    return jsonify({
+        "students": students,
+        "next": students[-1]['usn'] if len(rows) > limit else None
+    })
+
+@app.route('/admin/api/activities')
+def admin_activities_page():
+    if 'admin_id' not in session:
+        return jsonify({"error": "Login required"}), 401
+
+    search = request.args.get('q', '').strip()
+    after = request.args.get('after', 0, type=int)
+    limit = get_page_size()
 
-    activities = conn.execute('''
+    query = '''
         SELECT 
-            a.id AS "Activity ID",
-            e.event_name AS "Event Name",
-            a.activity_name AS "Activity Name",
-            e.event_type AS "Event Type",
-            a.start_datetime AS "Start Date",
-            a.end_datetime AS "End Date"
+            a.id AS activity_id,
+            e.id AS event_id,
+            e.event_name,
+            a.activity_name,
+            e.event_type,
+            a.start_datetime,
+            a.end_datetime
         FROM 
             activity_tbl a
         JOIN 
             event_type_tbl e ON a.event_type = e.id
-    ''').fetchall()
+        WHERE a.id > ?
+    '''
+    params = [after]
+
+    if search:
+        query += " AND (a.activity_name LIKE ? OR e.event_name LIKE ?)"
+        params += [f"%{search}%"] * 2
 
-    students = conn.execute("SELECT * FROM students_tbl").fetchall()
+    query += " ORDER BY a.id LIMIT ?"
+    params.append(limit + 1)
 
+    conn = get_db_connection()
+    rows = conn.execute(query, params).fetchall()
     conn.close()
 
-    return render_template('admin_dashboard.html', activities=activities, students=students)
+    activities = [dict(row) for row in rows[:limit]]
+    return jsonify({
+        "activities": activities,
+        "next": activities[-1]['activity_id'] if len(rows) > limit else None
+    })
 
 @app.route('/admin/add_activity', methods=['POST'])
 def add_activity():
@@ -223,6 +902,14 @@ def add_activity():
         activity_names = request.form.getlist('activityName[]')
         start_datetimes = request.form.getlist('startDatetime[]')
         end_datetimes = request.form.getlist('endDatetime[]')
+        lateness_thresholds = request.form.getlist('latenessThresholds[]')
+        lateness_thresholds += [''] * (len(activity_names) - len(lateness_thresholds))
+
+        try:
+            lateness_thresholds = [format_lateness_thresholds(value) for value in lateness_thresholds]
+        except ValueError:
+            flash('Lateness thresholds must be comma-separated minutes, e.g. 0,15,30.', 'error')
+            return redirect(url_for('admin_dashboard'))
 
         conn = get_db_connection()
         try:
@@ -230,13 +917,14 @@ def add_activity():
                          (event_name, event_type, session['admin_id']))
             event_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
 
-            for name, start, end in zip(activity_names, start_datetimes, end_datetimes):
-                conn.execute("INSERT INTO activity_tbl (event_type, activity_name, start_datetime, end_datetime, created_by) VALUES (?, ?, ?, ?, ?)",
-                             (event_id, name, start, end, session['admin_id']))
+            for name, start, end, thresholds in zip(activity_names, start_datetimes, end_datetimes, lateness_thresholds):
+                cursor = conn.execute("INSERT INTO activity_tbl (event_type, activity_name, start_datetime, end_datetime, start_at, end_at, lateness_thresholds, created_by) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                      (event_id, name, start, end, epoch_seconds(start), epoch_seconds(end), thresholds, session['admin_id']))
+                invalidate_activity_timing(cursor.lastrowid)
 
             conn.commit()
             flash('Activity added successfully!', 'success')
-        except sqlite3.IntegrityError:
+        except (sqlite3.IntegrityError, ValueError, OverflowError):
             flash('An error occurred. Please try again.', 'error')
         finally:
             conn.close()
@@ -285,16 +973,28 @@ def update_activity(event_id, activity_id):
     start_datetime = f"{start_date} {start_time}" if start_date and start_time else None
     end_datetime = f"{end_date} {end_time}" if end_date and end_time else None
 
+    # Left as is when the form has no thresholds field, cleared when it is empty
+    lateness_thresholds = request.form.get('lateness_thresholds')
+    try:
+        if lateness_thresholds is not None:
+            lateness_thresholds = format_lateness_thresholds(lateness_thresholds) or ''
+    except ValueError:
+        flash('Lateness thresholds must be comma-separated minutes, e.g. 0,15,30.', 'error')
+        return redirect(url_for('view_event', event_id=event_id))
+
     conn = get_db_connection()
     try:
         conn.execute("""
             UPDATE activity_tbl 
-            SET activity_name = ?, start_datetime = ?, end_datetime = ?
+            SET activity_name = ?, start_datetime = ?, end_datetime = ?, start_at = ?, end_at = ?,
+                lateness_thresholds = NULLIF(COALESCE(?, lateness_thresholds), '')
             WHERE id = ? AND event_type = ?
-        """, (activity_name, start_datetime, end_datetime, activity_id, event_id))
+        """, (activity_name, start_datetime, end_datetime, epoch_seconds(start_datetime), epoch_seconds(end_datetime),
+              lateness_thresholds, activity_id, event_id))
         conn.commit()
+        invalidate_activity_timing(activity_id)
         flash('Activity updated successfully!', 'success')
-    except sqlite3.Error as e:
+    except (sqlite3.Error, ValueError, OverflowError) as e:
         flash(f'An error occurred: {str(e)}', 'error')
     finally:
         conn.close()
@@ -316,6 +1016,7 @@ def delete_activity(event_id, activity_id):
         if event_type:
             conn.execute("DELETE FROM activity_tbl WHERE id = ? AND event_type = ?", (activity_id, event_type[0]))
             conn.commit()
+            invalidate_activity_timing(activity_id)
             flash('Activity deleted successfully!', 'success')
         else:
             flash('Invalid event ID!', 'error')
@@ -374,16 +1075,24 @@ def register():
         
         # Handle file upload only if USN is unique
         if profile_picture and allowed_file(profile_picture.filename):
-            filename = secure_filename(profile_picture.filename)
-            profile_picture.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+            # Named by USN and content so uploads never overwrite each other
+            data = profile_picture.read()
+            extension = profile_picture.filename.rsplit('.', 1)[1].lower()
+            filename = secure_filename(f"{usn}-{hashlib.sha1(data).hexdigest()[:12]}.{extension}")
+            with open(os.path.join(app.config['UPLOAD_FOLDER'], filename), 'wb') as f:
+                f.write(data)
         else:
             filename = None
 
         try:
             c.execute("INSERT INTO students_tbl (lastname, firstname, middlename, usn, course, year, date_of_birth, password, profile_picture) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
                       (lastname, firstname, middlename, usn, course, year, dob, password, filename))
+            bump_roster_version(conn, [usn])
             conn.commit()
+            invalidate_student_card(usn)
             generate_qr_code(usn)
+            if filename:
+                queue_thumbnails(filename, usn)
             flash('Registration successful!', 'success')
             conn.close()
             return redirect(url_for('index'))
@@ -470,12 +1179,22 @@ def singlethreads_page():
 
 @app.route('/qrcode/<usn>')
 def view_qrcode(usn):
-    qr_path = f'static/qrcodes/{usn}.png'
-    if os.path.exists(qr_path):
-        return send_from_directory('static/qrcodes', f'{usn}.png')
-    else:
-        flash('QR Code not found!', 'error')
-        return redirect(url_for('admin'))
+    box_size = request.args.get('box_size', QR_DEFAULT_BOX_SIZE, type=int)
+    border = request.args.get('border', QR_DEFAULT_BORDER, type=int)
+
+    if not 1 <= box_size <= 40 or not 0 <= border <= 10:
+        return jsonify({"error": "Invalid QR code size"}), 400
+
+    if get_student_card(usn) is None:
+        return jsonify({"error": "QR Code not found"}), 404
+
+    data, etag = get_qr_png(usn, box_size, border)
+
+    response = Response(data, mimetype='image/png')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['QR_MAX_AGE']
+    return response.make_conditional(request)
     
 @app.route('/events/<event_id>')
 def view_event(event_id):
@@ -489,6 +1208,35 @@ def view_event(event_id):
 
     return render_template('event.html', event=event, activities=activities)
 
+# Timestamps are stored as epoch seconds and only formatted here, for display
+# and export. The TEXT column covers legacy values the migration could not parse.
+def formatted_time_sql(epoch_column, text_column):
+    return (f"COALESCE(strftime('%Y-%m-%d %H:%M:%S', {epoch_column}, 'unixepoch', 'localtime'), {text_column})"
+            f" AS {text_column.split('.')[-1]}")
+
+# Statuses likewise are stored as attendance_status_tbl ids and turned back
+# into text here; the TEXT column covers rows written by older processes.
+def status_sql(id_column, text_column):
+    return (f"COALESCE((SELECT status FROM attendance_status_tbl WHERE id = {id_column}), {text_column})"
+            f" AS {text_column.split('.')[-1]}")
+
+ATTENDANCE_LIST_QUERY = f"""
+    SELECT 
+        students_tbl.usn,
+        students_tbl.firstname || ' ' || students_tbl.middlename || ' ' || students_tbl.lastname AS student_name,
+        event_type_tbl.event_name,
+        activity_tbl.activity_name,
+        {formatted_time_sql('attendance_list_tbl.time_in_at', 'attendance_list_tbl.time_in_date_and_time')},
+        {status_sql('attendance_list_tbl.time_in_status_id', 'attendance_list_tbl.time_in_status')},
+        {formatted_time_sql('attendance_list_tbl.time_out_at', 'attendance_list_tbl.time_out_date_and_time')},
+        {status_sql('attendance_list_tbl.time_out_status_id', 'attendance_list_tbl.time_out_status')}
+    FROM attendance_list_tbl
+    JOIN students_tbl ON attendance_list_tbl.student_usn = students_tbl.usn
+    JOIN activity_tbl ON attendance_list_tbl.activity_id = activity_tbl.id
+    JOIN event_type_tbl ON attendance_list_tbl.event_type = event_type_tbl.id
+    WHERE attendance_list_tbl.event_type = ? AND attendance_list_tbl.activity_id = ?
+"""
+
 @app.route('/view_students/event-<int:event_id>/activity-<int:activity_id>', methods=['GET', 'POST'])
 def view_students(event_id, activity_id):
     conn = get_db_connection()
@@ -522,22 +1270,7 @@ def view_students(event_id, activity_id):
         filter_value = request.form.get('filter_value', '')
 
     # Build the base query
-    query = """
-    SELECT 
-        students_tbl.usn,
-        students_tbl.firstname || ' ' || students_tbl.middlename || ' ' || students_tbl.lastname AS student_name,
-        event_type_tbl.event_name,
-        activity_tbl.activity_name,
-        attendance_list_tbl.time_in_date_and_time,
-        attendance_list_tbl.time_in_status,
-        attendance_list_tbl.time_out_date_and_time,
-        attendance_list_tbl.time_out_status
-    FROM attendance_list_tbl
-    JOIN students_tbl ON attendance_list_tbl.student_usn = students_tbl.usn
-    JOIN activity_tbl ON attendance_list_tbl.activity_id = activity_tbl.id
-    JOIN event_type_tbl ON attendance_list_tbl.event_type = event_type_tbl.id
-    WHERE attendance_list_tbl.event_type = ? AND attendance_list_tbl.activity_id = ?
-    """
+    query = attendance_query(conn, ATTENDANCE_LIST_QUERY, event_id)
     params = [event_id, activity_id]
 
     # Apply filter if both type and value are provided
@@ -597,95 +1330,385 @@ def verify_student():
     if not usn:
         return jsonify({"error": "Missing student USN"}), 400
 
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute("SELECT * FROM students_tbl WHERE usn = ?", (usn,))
-        student_details = c.fetchone()
+    student = get_student_card(usn)
 
-    if student_details is None:
+    if student is None:
         return jsonify({"error": "Student not found"}), 404
 
-    if student_details[9]:
-        profile_picture = url_for('static', filename=f'uploads/{student_details[9]}')
-    else:
-        profile_picture = url_for('static', filename='uploads/default_profile.jpg')
+    return jsonify({"student": student})
 
-    return jsonify({
-        "student": {
-            "fullname": f"{student_details[1]} {student_details[2]} {student_details[3]}",
-            "course": student_details[5],
-            "year": student_details[6],
-            "usn": student_details[4],
-            "profile_picture": profile_picture
-        }
-    })
+ROSTER_QUERY = "SELECT usn, lastname, firstname, middlename, course, year, profile_picture FROM students_tbl"
 
-@app.route('/submit_scan/<int:event_id>', methods=['POST'])
-def submit_scan(event_id):
-    usn = request.form.get("usn")
-    activity_id = request.form.get("activity_id")
-
-    if not usn or not activity_id:
-        return jsonify({"error": "Missing data"}), 400
+# Student cards for scanner pages to verify scans locally, as
+# {"version", "full", "students": {usn: [fullname, course, year, photo]}}.
+# ?since=<version> returns only students changed after that version;
+# ?course= limits the roster to one course. It hands out every student's
+# card, so it needs an admin session; other stations fall back to /verify_student.
+@app.route('/roster')
+def roster():
+    if 'admin_id' not in session:
+        return jsonify({"error": "Login required"}), 401
 
-    current_timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    course = request.args.get('course')
+    since = request.args.get('since', type=int)
 
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute("SELECT start_datetime FROM activity_tbl WHERE id = ?", (activity_id,))
-        activity = c.fetchone()
+    conn = get_db_connection()
+    version = conn.execute("SELECT version FROM roster_meta_tbl WHERE id = 1").fetchone()[0]
+    full = since is None or since > version
+
+    query = ROSTER_QUERY
+    conditions = []
+    params = []
+    if not full:
+        conditions.append("roster_version > ?")
+        params.append(since)
+    if course:
+        conditions.append("course = ?")
+        params.append(course)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+
+    students = {}
+    for student in conn.execute(query, params):
+        card = build_student_card(student)
+        students[card["usn"]] = [card["fullname"], card["course"], card["year"], card["profile_picture"]]
+    conn.close()
 
+    response = jsonify({"version": version, "full": full, "students": students})
+    response.set_etag(f"roster-{version}-{'full' if full else since}-{course or ''}")
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+# The activity plus the student's open attendance row, if any
+SCAN_LOOKUP_QUERY = '''
+    SELECT open_row.id AS open_id, open_row.time_in_status AS open_status,
+           open_row.time_in_at AS open_time_in_at
+    FROM activity_tbl a
+    LEFT JOIN attendance_list_tbl open_row
+        ON open_row.activity_id = a.id
+        AND open_row.student_usn = ?
+        AND open_row.event_type = ?
+        AND open_row.time_out_status = 'Not Checked Out'
+    WHERE a.id = ?
+'''
+
+# The first threshold is the grace period for "On Time", each later one is
+# its own "<n> mins late" bucket; anything past the last one is "LATE".
+def time_in_status_for(timing, time_in):
+    time_diff = (time_in.timestamp() - timing["start"]) / 60
+    on_time, *late = timing["thresholds"]
+    if time_diff <= on_time:
+        return "On Time"
+    for minutes in late:
+        if time_diff <= minutes:
+            return f"{minutes} mins late"
+    return "LATE"
+
+def outside_scan_window(timing, scanned_at):
+    scanned = scanned_at.timestamp()
+    if scanned < timing["start"] - app.config['SCAN_OPENS_BEFORE_START'] * 60:
+        return True
+    return timing["end"] is not None and scanned > timing["end"] + app.config['SCAN_CLOSES_AFTER_END'] * 60
+
+# Id of a status in attendance_status_tbl, adding it inside the caller's
+# transaction the first time it is used
+def status_id(conn, status):
+    known = _status_ids.get(status)
+    if known is not None:
+        return known
+    conn.execute("INSERT OR IGNORE INTO attendance_status_tbl (status) VALUES (?)", (status,))
+    return conn.execute("SELECT id FROM attendance_status_tbl WHERE status = ?", (status,)).fetchone()[0]
+
+ACTIVITY_NOT_FOUND = "Activity not found"
+OUTSIDE_SCAN_WINDOW = "Scan is outside the activity window"
+
+# Record a time-in inside the caller's transaction.
+# Returns the JSON result (with "error" on failure) and the live feed event,
+# which is None when nothing was written.
+def record_time_in(conn, usn, event_id, activity_id, time_in):
+    current_timestamp = time_in.strftime('%Y-%m-%d %H:%M:%S')
+
+    timing = get_activity_timing(conn, activity_id)
+    if timing is None:
+        return {"error": ACTIVITY_NOT_FOUND}, None
+    if outside_scan_window(timing, time_in):
+        return {"error": OUTSIDE_SCAN_WINDOW}, None
+
+    activity = conn.execute(SCAN_LOOKUP_QUERY, (usn, event_id, activity_id)).fetchone()
     if not activity:
-        return jsonify({"error": "Activity not found"}), 404
-
-    start_time = parser.parse(activity["start_datetime"])  
-    time_in = datetime.now()
-
-    time_diff = (time_in - start_time).total_seconds() / 60
-    if time_diff <= 0:
-        time_in_status = "On Time"
-    elif time_diff <= 15:
-        time_in_status = "15 mins late"
-    elif time_diff <= 30:
-        time_in_status = "30 mins late"
+        return {"error": ACTIVITY_NOT_FOUND}, None
+
+    time_in_status = time_in_status_for(timing, time_in)
+    time_in_at = epoch_seconds(time_in)
+
+    # Re-scans keep the original time-in. Only an earlier scan (an offline
+    # station catching up) replaces it.
+    if activity["open_id"] is not None and (activity["open_time_in_at"] is None
+                                            or time_in_at >= activity["open_time_in_at"]):
+        return {"message": "Attendance already recorded!", "time_in_status": activity["open_status"]}, None
+
+    conn.execute('''INSERT INTO attendance_list_tbl (
+        student_usn,
+        event_type,
+        activity_id,
+        time_in_date_and_time,
+        time_in_at,
+        time_in_status,
+        time_in_status_id,
+        time_out_date_and_time,
+        time_out_status,
+        time_out_status_id
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, 'Not Checked Out', 'Not Checked Out', ?)
+    ON CONFLICT (student_usn, activity_id, event_type) WHERE time_out_status = 'Not Checked Out'
+    DO UPDATE SET time_in_date_and_time = excluded.time_in_date_and_time,
+                  time_in_at = excluded.time_in_at,
+                  time_in_status = excluded.time_in_status,
+                  time_in_status_id = excluded.time_in_status_id''',
+    (usn, event_id, activity_id, current_timestamp, time_in_at, time_in_status,
+     status_id(conn, time_in_status), status_id(conn, 'Not Checked Out')))
+
+    if activity["open_id"] is None:
+        update_attendance_stat(conn, activity_id, 'time_in', time_in_status, 1)
+        update_attendance_stat(conn, activity_id, 'time_out', 'Not Checked Out', 1)
+        message = "Attendance recorded!"
     else:
-        time_in_status = "LATE"
+        if activity["open_status"] != time_in_status:
+            update_attendance_stat(conn, activity_id, 'time_in', activity["open_status"], -1)
+            update_attendance_stat(conn, activity_id, 'time_in', time_in_status, 1)
+        message = "Attendance updated!"
+
+    return {"message": message, "time_in_status": time_in_status}, {
+        "direction": "time_in",
+        "event_id": event_id,
+        "usn": usn,
+        "timestamp": current_timestamp,
+        "status": time_in_status
+    }
+
+# Record a time-out inside the caller's transaction, same return value as record_time_in
+def record_time_out(conn, usn, event_id, activity_id, time_out, time_out_status):
+    current_timestamp = time_out.strftime('%Y-%m-%d %H:%M:%S')
+
+    timing = get_activity_timing(conn, activity_id)
+    if timing is None:
+        return {"error": ACTIVITY_NOT_FOUND}, None
+    if outside_scan_window(timing, time_out):
+        return {"error": OUTSIDE_SCAN_WINDOW}, None
+
+    event = {
+        "direction": "time_out",
+        "event_id": event_id,
+        "usn": usn,
+        "timestamp": current_timestamp,
+        "status": time_out_status
+    }
+
+    previous_statuses = Counter(row[0] for row in conn.execute('''SELECT time_out_status FROM attendance_list_tbl 
+                                                                  WHERE student_usn = ? AND activity_id = ? AND event_type = ?''', 
+                                                               (usn, activity_id, event_id)))
+
+    if previous_statuses:
+        conn.execute('''UPDATE attendance_list_tbl 
+                        SET time_out_date_and_time = ?, time_out_at = ?, time_out_status = ?, time_out_status_id = ? 
+                        WHERE student_usn = ? AND activity_id = ? AND event_type = ?''', 
+                     (current_timestamp, epoch_seconds(time_out), time_out_status, status_id(conn, time_out_status),
+                      usn, activity_id, event_id))
+        for previous_status, total in previous_statuses.items():
+            update_attendance_stat(conn, activity_id, 'time_out', previous_status, -total)
+            update_attendance_stat(conn, activity_id, 'time_out', time_out_status, total)
+        return {"message": "Time-out updated!"}, event
+
+    conn.execute('''INSERT INTO attendance_list_tbl (
+        student_usn,    
+        event_type, 
+        activity_id, 
+        time_out_date_and_time, 
+        time_out_at, 
+        time_out_status,
+        time_out_status_id
+    ) VALUES (?, ?, ?, ?, ?, ?, ?)''', 
+    (usn, event_id, activity_id, current_timestamp, epoch_seconds(time_out), time_out_status,
+     status_id(conn, time_out_status)))
+    update_attendance_stat(conn, activity_id, 'time_out', time_out_status, 1)
+    return {"message": "Time-out recorded as a new entry!"}, event
+
+# Recent successful scans keyed by (usn, event_id, activity_id, direction).
+# A repeat read inside SCAN_DEBOUNCE_SECONDS, e.g. a badge held in front of
+# the camera, gets the first answer back without touching the database.
+_recent_scans = OrderedDict()
+_recent_scans_lock = threading.Lock()
+
+def get_recent_scan(usn, event_id, activity_id, direction):
+    with _recent_scans_lock:
+        entry = _recent_scans.get((usn, event_id, activity_id, direction))
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+def remember_scan(usn, event_id, activity_id, direction, result):
+    window = app.config['SCAN_DEBOUNCE_SECONDS']
+    if window <= 0:
+        return
+
+    key = (usn, event_id, activity_id, direction)
+    now = time.monotonic()
+    with _recent_scans_lock:
+        _recent_scans.pop(key, None)
+        _recent_scans[key] = (now + window, result)
+        # Entries are in expiry order, so expired ones are always at the front
+        while _recent_scans:
+            oldest = next(iter(_recent_scans))
+            if _recent_scans[oldest][0] > now:
+                break
+            del _recent_scans[oldest]
+
+# Record a single scan in its own transaction, or hand it to the scan writer
+# when SCAN_WRITER_ENABLED is set. Either way it returns once the scan is
+# committed; raises TimeoutError if the writer does not answer in time.
+# Repeats inside the debounce window are answered before either.
+def apply_scan(usn, event_id, activity_id, direction, scanned_at, time_out_status="Checked Out"):
+    recent = get_recent_scan(usn, event_id, activity_id, direction)
+    if recent is not None:
+        increment_metric('attendance_scans_debounced_total')
+        return dict(recent, debounced=True), None
+
+    if app.config['SCAN_WRITER_ENABLED']:
+        future = submit_to_scan_writer(usn, event_id, activity_id, direction, scanned_at, time_out_status)
+        result, event = future.result(timeout=app.config['SCAN_WRITER_TIMEOUT'])
+    else:
+        result, event = write_scan(usn, event_id, activity_id, direction, scanned_at, time_out_status)
 
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute('''SELECT * FROM attendance_list_tbl 
-                     WHERE student_usn = ? AND activity_id = ? AND event_type = ? 
-                     AND time_out_status = "Not Checked Out"''', 
-                  (usn, activity_id, event_id))
-        existing_record = c.fetchone()
-
-    if existing_record:
-        with get_db_connection() as conn:
-            c = conn.cursor()
-            c.execute('''UPDATE attendance_list_tbl 
-                         SET time_in_date_and_time = ?, time_in_status = ? 
-                         WHERE student_usn = ? AND activity_id = ? AND event_type = ? 
-                         AND time_out_status = "Not Checked Out"''', 
-                      (current_timestamp, time_in_status, usn, activity_id, event_id))
-            conn.commit()
+    if "error" not in result:
+        remember_scan(usn, event_id, activity_id, direction, result)
+    return result, event
 
-        return jsonify({"message": "Attendance updated!", "time_in_status": time_in_status})
+def record_direction(conn, usn, event_id, activity_id, direction, scanned_at, time_out_status="Checked Out"):
+    if direction == 'time_in':
+        return record_time_in(conn, usn, event_id, activity_id, scanned_at)
+    return record_time_out(conn, usn, event_id, activity_id, scanned_at, time_out_status)
 
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute('''INSERT INTO attendance_list_tbl (
-            student_usn, 
-            event_type, 
-            activity_id, 
-            time_in_date_and_time, 
-            time_in_status, 
-            time_out_date_and_time, 
-            time_out_status
-        ) VALUES (?, ?, ?, ?, ?, "Not Checked Out", "Not Checked Out")''', 
-        (usn, event_id, activity_id, current_timestamp, time_in_status))
+# Scan writes and the auto-checkout sweep in this process queue on this
+# lock before BEGIN IMMEDIATE instead of in SQLite's busy handler. With many
+# threads writing the same rows, waiters there could sit out the whole
+# busy_timeout and fail with "database is locked".
+_scan_write_lock = threading.Lock()
+
+def write_scan(usn, event_id, activity_id, direction, scanned_at, time_out_status):
+    conn = get_db_connection()
+    _scan_write_lock.acquire()
+    try:
+        # Take the write lock up front so the lookup and the upsert see the same state
+        conn.execute("BEGIN IMMEDIATE")
+        result, event = record_direction(conn, usn, event_id, activity_id, direction, scanned_at, time_out_status)
+        conn.commit()
+    except BaseException:
+        # Inside a request close() keeps the connection for teardown, which
+        # would hold the write lock until the response is done
+        conn.rollback()
+        raise
+    finally:
+        _scan_write_lock.release()
+        conn.close()
+    return result, event
+
+# Group commit: one writer thread drains queued scans and applies up to
+# SCAN_WRITER_BATCH_MAX of them per transaction, waiting at most
+# SCAN_WRITER_FLUSH_MS for a batch to fill. Request threads block on a
+# Future that is resolved only after the batch has committed.
+#
+# SCAN_WRITER_SYNCHRONOUS is the durability trade-off for the writer's
+# connection: FULL syncs the WAL on every group commit, NORMAL (the default)
+# survives an application crash but can lose the last commits on power
+# loss, OFF leaves flushing to the OS.
+_scan_writer_queue = queue.Queue()
+_scan_writer_thread = None
+_scan_writer_lock = threading.Lock()
+
+def submit_to_scan_writer(*scan):
+    global _scan_writer_thread
+    with _scan_writer_lock:
+        if _scan_writer_thread is None:
+            _scan_writer_thread = threading.Thread(target=run_scan_writer, name='scan-writer', daemon=True)
+            _scan_writer_thread.start()
+
+    future = Future()
+    _scan_writer_queue.put((scan, future))
+    return future
+
+def run_scan_writer():
+    conn = open_db_connection()
+    conn.execute(f"PRAGMA synchronous = {sqlite_synchronous(app.config['SCAN_WRITER_SYNCHRONOUS'])};")
+
+    while True:
+        batch = [_scan_writer_queue.get()]
+        deadline = time.perf_counter() + app.config['SCAN_WRITER_FLUSH_MS'] / 1000
+        while len(batch) < app.config['SCAN_WRITER_BATCH_MAX']:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(_scan_writer_queue.get(timeout=remaining) if remaining > 0
+                             else _scan_writer_queue.get_nowait())
+            except queue.Empty:
+                break
+        write_scan_batch(conn, batch)
+
+def write_scan_batch(conn, batch):
+    outcomes = []
+    _scan_write_lock.acquire()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        for scan, future in batch:
+            # A failing scan is rolled back on its own and its error re-raised
+            # in the request thread, as write_scan would raise it, without
+            # taking the rest of the batch down with it
+            conn.execute("SAVEPOINT scan_item")
+            try:
+                outcomes.append((future, record_direction(conn, *scan), None))
+                conn.execute("RELEASE SAVEPOINT scan_item")
+            except Exception as e:
+                conn.execute("ROLLBACK TO SAVEPOINT scan_item")
+                conn.execute("RELEASE SAVEPOINT scan_item")
+                outcomes.append((future, None, e))
         conn.commit()
+    except Exception as e:
+        if conn.in_transaction:
+            conn.rollback()
+        for _, future in batch:
+            future.set_exception(e)
+        return
+    finally:
+        _scan_write_lock.release()
+
+    increment_metric('attendance_scan_writer_commits_total')
+    increment_metric('attendance_scan_writer_scans_total', len(batch))
+    observe_metric('attendance_scan_writer_batch_size', len(batch), buckets=BATCH_BUCKETS)
 
-    return jsonify({"message": "Attendance recorded!", "time_in_status": time_in_status})
+    for future, outcome, error in outcomes:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(outcome)
+
+@app.route('/submit_scan/<int:event_id>', methods=['POST'])
+def submit_scan(event_id):
+    usn = request.form.get("usn")
+    activity_id = request.form.get("activity_id", type=int)
+
+    if not usn or not request.form.get("activity_id"):
+        return jsonify({"error": "Missing data"}), 400
+    if activity_id is None:
+        return jsonify({"error": ACTIVITY_NOT_FOUND}), 404
+
+    try:
+        result, event = apply_scan(usn, event_id, activity_id, 'time_in', datetime.now())
+    except TimeoutError:
+        return jsonify({"error": "Timed out waiting for the scan to be saved"}), 503
+
+    if "error" in result:
+        return jsonify(result), 404 if result["error"] == ACTIVITY_NOT_FOUND else 409
+
+    if event is not None:
+        publish_scan_event(activity_id, event)
+    return jsonify(result)
 
     
 @app.route('/timeout/event-<int:event_id>/activity-<int:activity_id>', methods=['GET'])
@@ -712,46 +1735,394 @@ def timeout_attendance(event_id, activity_id):
 @app.route('/timeout_submit_scan/<int:event_id>', methods=['POST'])
 def timeout_submit_scan(event_id):
     usn = request.form.get("usn")
-    activity_id = request.form.get("activity_id")
+    activity_id = request.form.get("activity_id", type=int)
     time_out_status = request.form.get("time_out_status", "Checked Out")
 
-    if not usn or not activity_id:
+    if not usn or not request.form.get("activity_id"):
         return jsonify({"error": "Missing data"}), 400
+    if activity_id is None:
+        return jsonify({"error": ACTIVITY_NOT_FOUND}), 404
 
-    from datetime import datetime
-    current_timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        result, event = apply_scan(usn, event_id, activity_id, 'time_out', datetime.now(), time_out_status)
+    except TimeoutError:
+        return jsonify({"error": "Timed out waiting for the scan to be saved"}), 503
+
+    if "error" in result:
+        return jsonify(result), 404 if result["error"] == ACTIVITY_NOT_FOUND else 409
+
+    if event is not None:
+        publish_scan_event(activity_id, event)
+    return jsonify(result)
+
+# Client scan time from a batch record: ISO 8601 string or epoch seconds/milliseconds.
+# Aware times are converted to server local time, which is what activities are stored in.
+def parse_scan_time(value):
+    if value is None or value == '':
+        return datetime.now()
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000 if value > 1e11 else value)
+
+    scanned_at = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if scanned_at.tzinfo is not None:
+        scanned_at = scanned_at.astimezone().replace(tzinfo=None)
+    return scanned_at
+
+SCAN_DIRECTIONS = {'in': 'time_in', 'time_in': 'time_in', 'out': 'time_out', 'time_out': 'time_out'}
+
+# Record one scan of a multi-scan request under its own savepoint, so a
+# failing record is rolled back without losing the rest of the transaction.
+def record_scan(conn, usn, event_id, activity_id, direction, scanned_at, time_out_status="Checked Out"):
+    conn.execute("SAVEPOINT scan")
+    try:
+        outcome, event = record_direction(conn, usn, event_id, activity_id, direction, scanned_at, time_out_status)
+        conn.execute("RELEASE SAVEPOINT scan")
+    except sqlite3.Error as e:
+        conn.execute("ROLLBACK TO SAVEPOINT scan")
+        conn.execute("RELEASE SAVEPOINT scan")
+        outcome, event = {"error": str(e)}, None
+    return outcome, event
+
+# Apply a batch of queued scans in one transaction. Each record is
+# {usn, activity_id, scanned_at, direction[, time_out_status]} and gets its
+# own result; a bad record is rolled back on its own without failing the rest.
+@app.route('/submit_scans', methods=['POST'])
+def submit_scans():
+    payload = request.get_json(silent=True)
+    scans = payload.get('scans') if isinstance(payload, dict) else payload
+
+    if not isinstance(scans, list) or not scans:
+        return jsonify({"error": "Expected a non-empty list of scans"}), 400
+    if len(scans) > app.config['SCAN_BATCH_MAX']:
+        return jsonify({"error": f"At most {app.config['SCAN_BATCH_MAX']} scans per batch"}), 413
+
+    results = []
+    events = []
+    activity_events = {}
 
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute('''SELECT * FROM attendance_list_tbl 
-                     WHERE student_usn = ? AND activity_id = ? AND event_type = ?''', 
-                  (usn, activity_id, event_id))
-        existing_record = c.fetchone()
-
-    if existing_record:
-        with get_db_connection() as conn:
-            c = conn.cursor()
-            c.execute('''UPDATE attendance_list_tbl 
-                         SET time_out_date_and_time = ?, time_out_status = ? 
-                         WHERE student_usn = ? AND activity_id = ? AND event_type = ?''', 
-                      (current_timestamp, time_out_status, usn, activity_id, event_id))
-            conn.commit()
-        return jsonify({"message": "Time-out updated!"})
+    conn = get_db_connection()
+    _scan_write_lock.acquire()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        for index, scan in enumerate(scans):
+            if not isinstance(scan, dict):
+                results.append({"index": index, "error": "Invalid scan record"})
+                continue
+
+            usn = scan.get("usn")
+            activity_id = scan.get("activity_id")
+            direction = scan.get("direction", "in")
+            time_out_status = scan.get("time_out_status", "Checked Out")
+
+            # Lists or objects would fail the lookups below and abort the whole batch
+            if not all(value is None or isinstance(value, (int, str))
+                       for value in (usn, activity_id, direction, time_out_status)):
+                results.append({"index": index, "error": "Invalid scan record"})
+                continue
+
+            direction = SCAN_DIRECTIONS.get(direction)
+            result = {"index": index, "usn": usn}
+
+            if not usn or not activity_id or direction is None:
+                results.append(dict(result, error="Missing data"))
+                continue
+
+            try:
+                scanned_at = parse_scan_time(scan.get("scanned_at"))
+            except (TypeError, ValueError, OverflowError, OSError):
+                results.append(dict(result, error="Invalid scanned_at"))
+                continue
+
+            try:
+                activity_id = int(activity_id)
+            except ValueError:
+                results.append(dict(result, error=ACTIVITY_NOT_FOUND))
+                continue
+
+            if activity_id not in activity_events:
+                row = conn.execute("SELECT event_type FROM activity_tbl WHERE id = ?", (activity_id,)).fetchone()
+                activity_events[activity_id] = row[0] if row else None
+            event_id = activity_events[activity_id]
+
+            if event_id is None:
+                results.append(dict(result, error="Activity not found"))
+                continue
+
+            outcome, event = record_scan(conn, usn, event_id, activity_id, direction, scanned_at, time_out_status)
+            results.append(dict(result, direction=direction, **outcome))
+            if event is not None:
+                events.append((activity_id, event))
 
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute('''INSERT INTO attendance_list_tbl (
-            student_usn,    
-            event_type, 
-            activity_id, 
-            time_out_date_and_time, 
-            time_out_status
-        ) VALUES (?, ?, ?, ?, ?)''', 
-        (usn, event_id, activity_id, current_timestamp, time_out_status))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        _scan_write_lock.release()
+        conn.close()
+
+    for activity_id, event in events:
+        publish_scan_event(activity_id, event)
+
+    return jsonify({"results": results})
+
+# Decode every QR code in an uploaded frame or sign-in sheet photo. Runs in
+# the decode pool, so it only takes bytes and returns plain data.
+def decode_qr_image(data, max_side):
+    try:
+        with Image.open(BytesIO(data)) as img:
+            # zbar only looks at luminance; shrinking first keeps decode time flat
+            # for full-resolution phone photos
+            img = img.convert('L')
+            if max(img.size) > max_side:
+                img.thumbnail((max_side, max_side))
+            symbols = decode(img)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        return {"error": f"Unreadable image: {e}"}
+
+    usns = []
+    for symbol in symbols:
+        usn = symbol.data.decode('utf-8', errors='replace').strip()
+        if usn and usn not in usns:
+            usns.append(usn)
+    return {"usns": usns}
+
+_decode_executor = None
+_decode_executor_lock = threading.Lock()
+
+def get_decode_executor():
+    global _decode_executor
+    with _decode_executor_lock:
+        if _decode_executor is None:
+            _decode_executor = ProcessPoolExecutor(max_workers=app.config['DECODE_WORKERS'])
+        return _decode_executor
+
+def decode_qr_images(images):
+    decode_image = partial(decode_qr_image, max_side=app.config['DECODE_MAX_SIDE'])
+    if len(images) > 1 and app.config['DECODE_WORKERS'] > 1:
+        return list(get_decode_executor().map(decode_image, images))
+    return [decode_image(data) for data in images]
+
+# Decode QR codes server-side from uploaded images (multipart field "images")
+# and record every USN found through the normal scan path. Takes the same
+# activity_id / direction / time_out_status fields as the batch endpoint.
+@app.route('/decode_scans/<int:event_id>', methods=['POST'])
+def decode_scans(event_id):
+    activity_id = request.form.get("activity_id", type=int)
+    direction = SCAN_DIRECTIONS.get(request.form.get("direction", "in"))
+    time_out_status = request.form.get("time_out_status", "Checked Out")
+    files = [f for f in request.files.getlist("images") if f and f.filename]
+
+    if not request.form.get("activity_id") or direction is None or not files:
+        return jsonify({"error": "Missing data"}), 400
+    if activity_id is None:
+        return jsonify({"error": ACTIVITY_NOT_FOUND}), 404
+    if len(files) > app.config['DECODE_BATCH_MAX']:
+        return jsonify({"error": f"At most {app.config['DECODE_BATCH_MAX']} images per request"}), 413
+    if not all(allowed_file(f.filename) for f in files):
+        return jsonify({"error": "Invalid file type"}), 400
+
+    decoded = decode_qr_images([f.read() for f in files])
+
+    results = []
+    events = []
+    scanned_at = datetime.now()
+
+    conn = get_db_connection()
+    _scan_write_lock.acquire()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        if not conn.execute("SELECT 1 FROM activity_tbl WHERE id = ? AND event_type = ?",
+                            (activity_id, event_id)).fetchone():
+            conn.rollback()
+            return jsonify({"error": ACTIVITY_NOT_FOUND}), 404
+
+        for index, (f, image) in enumerate(zip(files, decoded)):
+            result = {"index": index, "filename": f.filename}
+            if "error" in image:
+                results.append(dict(result, error=image["error"]))
+                continue
+
+            scans = []
+            for usn in image["usns"]:
+                outcome, event = record_scan(conn, usn, event_id, activity_id, direction,
+                                             scanned_at, time_out_status)
+                scans.append(dict(outcome, usn=usn))
+                if event is not None:
+                    events.append(event)
+            results.append(dict(result, direction=direction, scans=scans))
 
         conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        _scan_write_lock.release()
+        conn.close()
 
-    return jsonify({"message": "Time-out recorded as a new entry!"})
+    for event in events:
+        publish_scan_event(activity_id, event)
+
+    return jsonify({"results": results})
+
+# Prometheus scrape endpoint; only answers local requests unless METRICS_ALLOW_REMOTE is set
+@app.route('/metrics')
+def metrics():
+    if not app.config['METRICS_ALLOW_REMOTE'] and request.remote_addr not in ('127.0.0.1', '::1'):
+        return "Forbidden", 403
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+# Recent scan events per activity, fanned out to /live monitors. Each activity
+# keeps a bounded ring buffer so monitors that connect late can catch up.
+_live_feeds = {}
+_live_feed_condition = threading.Condition()
+
+def publish_scan_event(activity_id, event):
+    card = get_student_card(event["usn"])
+    event = dict(event, activity_id=int(activity_id), fullname=card["fullname"] if card else None)
+
+    with _live_feed_condition:
+        feed = _live_feeds.get(event["activity_id"])
+        if feed is None:
+            feed = _live_feeds[event["activity_id"]] = {
+                "events": deque(maxlen=app.config['LIVE_FEED_SIZE']),
+                "last_id": 0
+            }
+        feed["last_id"] += 1
+        event["id"] = feed["last_id"]
+        feed["events"].append(event)
+        _live_feed_condition.notify_all()
+
+# Events newer than after_id, waiting up to timeout seconds for one to arrive
+def read_scan_events(activity_id, after_id, timeout):
+    def pending():
+        feed = _live_feeds.get(activity_id)
+        return feed is not None and feed["last_id"] > after_id
+
+    with _live_feed_condition:
+        feed = _live_feeds.get(activity_id)
+        if feed is not None and after_id > feed["last_id"]:
+            # The client saw ids from before a restart, start over
+            after_id = 0
+        _live_feed_condition.wait_for(pending, timeout)
+        feed = _live_feeds.get(activity_id)
+        if feed is None:
+            return []
+        return [event for event in feed["events"] if event["id"] > after_id]
+
+@app.route('/live/activity-<int:activity_id>')
+def live_feed(activity_id):
+    # EventSource resends the last id it saw when it reconnects
+    after_id = request.headers.get('Last-Event-ID', type=int)
+    if after_id is None:
+        after_id = request.args.get('after', 0, type=int)
+
+    def generate(after_id):
+        yield "retry: 3000\n\n"
+        while True:
+            events = read_scan_events(activity_id, after_id, app.config['LIVE_FEED_KEEPALIVE'])
+            if not events:
+                yield ": keepalive\n\n"
+                continue
+            for event in events:
+                after_id = event["id"]
+                yield f"id: {event['id']}\nevent: scan\ndata: {json.dumps(event)}\n\n"
+
+    response = Response(generate(after_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Activities whose scan window has closed but that still have open rows.
+# Driven from activity_tbl by end_at so a sweep only probes the rows of
+# activities that have ended.
+AUTO_CHECKOUT_QUERY = '''
+    SELECT a.id, a.end_at
+    FROM activity_tbl a
+    WHERE a.end_at <= ? AND EXISTS (
+        SELECT 1 FROM attendance_list_tbl open_row
+        WHERE open_row.activity_id = a.id AND open_row.time_out_status = 'Not Checked Out'
+    )
+'''
+
+# Close every open row of activities whose scan window has ended, one UPDATE
+# per activity, checking them out at the activity's end time with
+# AUTO_CHECKOUT_STATUS. Returns {activity_id: rows checked out}.
+def auto_checkout(now=None):
+    cutoff = (now if now is not None else time.time()) - app.config['SCAN_CLOSES_AFTER_END'] * 60
+    status = app.config['AUTO_CHECKOUT_STATUS']
+    swept = {}
+
+    conn = get_db_connection()
+    _scan_write_lock.acquire()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        for activity_id, end_at in conn.execute(AUTO_CHECKOUT_QUERY, (cutoff,)).fetchall():
+            updated = conn.execute('''UPDATE attendance_list_tbl
+                                     SET time_out_status = ?, time_out_status_id = ?, time_out_at = ?,
+                                         time_out_date_and_time = strftime('%Y-%m-%d %H:%M:%S', ?, 'unixepoch', 'localtime')
+                                     WHERE activity_id = ? AND time_out_status = 'Not Checked Out'
+                                  ''', (status, status_id(conn, status), end_at, end_at, activity_id)).rowcount
+            update_attendance_stat(conn, activity_id, 'time_out', 'Not Checked Out', -updated)
+            update_attendance_stat(conn, activity_id, 'time_out', status, updated)
+            swept[activity_id] = updated
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        _scan_write_lock.release()
+        conn.close()
+    return swept
+
+_auto_checkout_thread = None
+_auto_checkout_lock = threading.Lock()
+
+def run_auto_checkout():
+    while True:
+        time.sleep(app.config['AUTO_CHECKOUT_INTERVAL'])
+        try:
+            for activity_id, rows in auto_checkout().items():
+                app.logger.info("Auto checkout: %s rows closed for activity %s", rows, activity_id)
+        except sqlite3.Error as e:
+            app.logger.warning("Auto checkout failed: %s", e)
+
+# The sweep thread starts with the first request rather than at import, so
+# CLI commands and scripts that import the app do not run it.
+@app.before_request
+def start_auto_checkout():
+    global _auto_checkout_thread
+    if _auto_checkout_thread is not None or not app.config['AUTO_CHECKOUT_ENABLED']:
+        return
+    with _auto_checkout_lock:
+        if _auto_checkout_thread is None:
+            _auto_checkout_thread = threading.Thread(target=run_auto_checkout, name='auto-checkout', daemon=True)
+            _auto_checkout_thread.start()
+
+# Add delta to one status counter of an activity; called inside the scan transaction
+def update_attendance_stat(conn, activity_id, status_type, status, delta):
+    conn.execute('''INSERT INTO attendance_stats_tbl (activity_id, status_type, status, total)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (activity_id, status_type, status)
+                    DO UPDATE SET total = total + excluded.total''',
+                 (activity_id, status_type, status, delta))
+
+@app.route('/stats/activity-<int:activity_id>')
+def activity_stats(activity_id):
+    conn = get_db_connection()
+    rows = conn.execute("SELECT status_type, status, total FROM attendance_stats_tbl WHERE activity_id = ?",
+                        (activity_id,)).fetchall()
+    conn.close()
+
+    stats = {"activity_id": activity_id, "time_in": {}, "time_out": {}}
+    for row in rows:
+        if row['total']:
+            stats[row['status_type']][row['status']] = row['total']
+    stats["total"] = sum(stats["time_in"].values())
+
+    response = jsonify(stats)
+    response.cache_control.no_store = True
+    return response
 
 def insert_student(data):
     conn = get_db_connection()
@@ -763,61 +2134,377 @@ def insert_student(data):
                 date_of_birth, password, profile_picture, approved_by
             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', data)
+        bump_roster_version(conn, [data[3]])
         conn.commit()
+        invalidate_student_card(data[3])
         return True
     except sqlite3.IntegrityError:
         return False
     finally:
         conn.close()
 
-# Generate QR code if it doesn't already exist
-def generate_qr_code(usn):
-    folder = 'static/qrcodes'
-    os.makedirs(folder, exist_ok=True)
-    filepath = os.path.join(folder, f'{usn}.png')
-    
-    if not os.path.exists(filepath):
-        # Generate QR code
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(usn)
-        qr.make(fit=True)
-        img = qr.make_image(fill='black', back_color='white').convert('RGB')
-        
-        # Prepare to draw text
+QR_DEFAULT_BOX_SIZE = 10
+QR_DEFAULT_BORDER = 4
+
+_qr_font = None
+
+# Loaded once per process; pool workers call this as their initializer
+def get_qr_font():
+    global _qr_font
+    if _qr_font is None:
         try:
-            font = ImageFont.truetype("arial.ttf", 20)
+            _qr_font = ImageFont.truetype("arial.ttf", 20)
         except IOError:
-            font = ImageFont.load_default()
-        
-        draw = ImageDraw.Draw(img)
-        
-        # Get text size using textbbox (compatible with Pillow 8+)
-        bbox = draw.textbbox((0, 0), usn, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        
-        img_width, img_height = img.size
-        new_height = img_height + text_height + 10
-        
-        # Create new image with extra space
-        new_img = Image.new("RGB", (img_width, new_height), "white")
-        new_img.paste(img, (0, 0))
-        
-        # Draw USN text centered
-        draw = ImageDraw.Draw(new_img)
-        text_position = ((img_width - text_width) // 2, img_height + 5)
-        draw.text(text_position, usn, font=font, fill="black")
-        
-        new_img.save(filepath)
-        print(f"QR code with USN generated for {usn}")
-    
+            _qr_font = ImageFont.load_default()
+    return _qr_font
+
+def qr_code_path(usn):
+    return os.path.join(app.config['QR_FOLDER'], f'{usn}.png')
+
+# Render the QR code for a USN with the USN printed underneath
+def render_qr_image(usn, box_size=QR_DEFAULT_BOX_SIZE, border=QR_DEFAULT_BORDER):
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=box_size,
+        border=border,
+    )
+    qr.add_data(usn)
+    qr.make(fit=True)
+    img = qr.make_image(fill='black', back_color='white').convert('RGB')
+
+    font = get_qr_font()
+    draw = ImageDraw.Draw(img)
+
+    # Get text size using textbbox (compatible with Pillow 8+)
+    bbox = draw.textbbox((0, 0), usn, font=font)
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
+
+    img_width, img_height = img.size
+    new_height = img_height + text_height + 10
+
+    # Create new image with extra space
+    new_img = Image.new("RGB", (img_width, new_height), "white")
+    new_img.paste(img, (0, 0))
+
+    # Draw USN text centered
+    draw = ImageDraw.Draw(new_img)
+    text_position = ((img_width - text_width) // 2, img_height + 5)
+    draw.text(text_position, usn, font=font, fill="black")
+
+    return new_img
+
+# Render the default-sized PNG into QR_FOLDER and return the render time.
+# Runs in ProcessPoolExecutor workers, so it must not touch metrics, caches
+# or anything else guarded by a lock of the parent process.
+def write_qr_code(usn):
+    started = time.perf_counter()
+    img = render_qr_image(usn)
+    elapsed = time.perf_counter() - started
+    img.save(qr_code_path(usn))
+    return elapsed
+
+# Bookkeeping for a PNG written by write_qr_code, done in the parent process
+def qr_code_written(usn, elapsed):
+    observe_metric('attendance_qr_render_seconds', elapsed)
+    invalidate_qr_png(usn)
+    print(f"QR code with USN generated for {usn}")
+
+# Generate QR code if it doesn't already exist
+def generate_qr_code(usn, overwrite=False):
+    os.makedirs(app.config['QR_FOLDER'], exist_ok=True)
+    filepath = qr_code_path(usn)
+
+    if overwrite or not os.path.exists(filepath):
+        qr_code_written(usn, write_qr_code(usn))
+
     return filepath
 
+# Rendered PNGs served by /qrcode/<usn>, keyed by (usn, box_size, border) (LRU)
+_qr_png_cache = OrderedDict()
+_qr_png_cache_lock = threading.Lock()
+
+# Returns the PNG bytes and their content hash, rendering on first use.
+# Default-sized codes are also kept on disk in QR_FOLDER.
+def get_qr_png(usn, box_size=QR_DEFAULT_BOX_SIZE, border=QR_DEFAULT_BORDER):
+    key = (usn, box_size, border)
+    with _qr_png_cache_lock:
+        entry = _qr_png_cache.get(key)
+        if entry is not None:
+            _qr_png_cache.move_to_end(key)
+    record_cache_lookup('qr_png', entry is not None)
+    if entry is not None:
+        return entry
+
+    is_default = box_size == QR_DEFAULT_BOX_SIZE and border == QR_DEFAULT_BORDER
+    filepath = qr_code_path(usn)
+
+    if is_default and os.path.exists(filepath):
+        with open(filepath, 'rb') as f:
+            data = f.read()
+    else:
+        output = BytesIO()
+        started = time.perf_counter()
+        img = render_qr_image(usn, box_size, border)
+        observe_metric('attendance_qr_render_seconds', time.perf_counter() - started)
+        img.save(output, format='PNG')
+        data = output.getvalue()
+        if is_default:
+            os.makedirs(app.config['QR_FOLDER'], exist_ok=True)
+            with open(filepath, 'wb') as f:
+                f.write(data)
+
+    entry = (data, hashlib.sha1(data).hexdigest())
+    with _qr_png_cache_lock:
+        _qr_png_cache[key] = entry
+        while len(_qr_png_cache) > app.config['QR_CACHE_SIZE']:
+            _qr_png_cache.popitem(last=False)
+    return entry
+
+def invalidate_qr_png(usn):
+    with _qr_png_cache_lock:
+        for key in [key for key in _qr_png_cache if key[0] == usn]:
+            del _qr_png_cache[key]
+
+# Generate QR codes for many USNs across a process pool.
+# USNs that already have a PNG are skipped unless overwrite is set.
+# on_progress, if given, is called with the number of USNs done so far.
+def generate_qr_codes(usns, overwrite=False, workers=None, on_progress=None):
+    usns = list(dict.fromkeys(usns))
+    pending = [usn for usn in usns if overwrite or not os.path.exists(qr_code_path(usn))]
+    workers = workers or app.config['QR_WORKERS']
+    done = len(usns) - len(pending)
+
+    started = time.perf_counter()
+    if len(pending) > 1 and workers > 1:
+        os.makedirs(app.config['QR_FOLDER'], exist_ok=True)
+        with ProcessPoolExecutor(max_workers=workers, initializer=get_qr_font) as executor:
+            chunksize = max(1, len(pending) // (workers * 4))
+            for usn, elapsed in zip(pending, executor.map(write_qr_code, pending, chunksize=chunksize)):
+                qr_code_written(usn, elapsed)
+                done += 1
+                if on_progress:
+                    on_progress(done)
+    else:
+        for usn in pending:
+            generate_qr_code(usn, overwrite=overwrite)
+            done += 1
+            if on_progress:
+                on_progress(done)
+    elapsed = time.perf_counter() - started
+
+    return {
+        'paths': [qr_code_path(usn) for usn in usns],
+        'generated': len(pending),
+        'skipped': len(usns) - len(pending),
+        'seconds': round(elapsed, 3),
+        'per_second': round(len(pending) / elapsed, 1) if elapsed and pending else 0.0
+    }
+
+@app.cli.command('generate-qrcodes')
+@click.option('--overwrite', is_flag=True, help='Re-render PNGs that already exist.')
+@click.option('--workers', type=int, default=None, help='Number of worker processes.')
+def generate_qrcodes_command(overwrite, workers):
+    """Render QR codes for every student in students_tbl."""
+    conn = get_db_connection()
+    usns = [row['usn'] for row in conn.execute("SELECT usn FROM students_tbl")]
+    conn.close()
+
+    result = generate_qr_codes(usns, overwrite=overwrite, workers=workers)
+    click.echo(f"{result['generated']} generated, {result['skipped']} skipped "
+               f"in {result['seconds']}s ({result['per_second']}/s)")
+
+@app.cli.command('auto-checkout')
+def auto_checkout_command():
+    """Check out open attendance rows of activities that have ended."""
+    swept = auto_checkout()
+    for activity_id, rows in swept.items():
+        click.echo(f"Activity {activity_id}: {rows} rows checked out")
+    click.echo(f"{sum(swept.values())} rows checked out in {len(swept)} activities")
+
+@app.cli.command('generate-thumbnails')
+@click.option('--overwrite', is_flag=True, help='Re-encode thumbnails that already exist.')
+def generate_thumbnails_command(overwrite):
+    """Make profile picture thumbnails for existing uploads."""
+    conn = get_db_connection()
+    filenames = {row['profile_picture'] for row in conn.execute(
+        "SELECT DISTINCT profile_picture FROM students_tbl WHERE profile_picture IS NOT NULL")}
+    conn.close()
+    filenames.add('default_profile.jpg')
+
+    written = 0
+    for filename in sorted(filenames):
+        if not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], filename)):
+            click.echo(f"Missing upload: {filename}")
+            continue
+        try:
+            written += make_thumbnails(filename, overwrite=overwrite)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            click.echo(f"Could not make thumbnails for {filename}: {e}")
+
+    # Cards built before this run still point at the full-size uploads
+    invalidate_student_card()
+    click.echo(f"{written} thumbnails written for {len(filenames)} pictures")
+
+STUDENT_CSV_COLUMNS = ('USN', 'LAST NAME', 'FIRST NAME', 'MIDDLE NAME', 'PROGRAM', 'YEAR')
+
+def student_from_csv_row(row):
+    usn = (row['USN'] or '').strip()
+    lastname = (row['LAST NAME'] or '').strip()
+    firstname = (row['FIRST NAME'] or '').strip()
+    middlename = (row['MIDDLE NAME'] or '').strip()
+    program = (row['PROGRAM'] or '').strip()
+    year = (row['YEAR'] or '').strip()
+
+    if not usn or not lastname or not firstname or not program or not year:
+        return None
+
+    password = usn[:4] + firstname.replace(" ", "").lower()
+    date_of_birth = "no data recorded"
+    profile_picture = "default_profile.jpg"
+    approved_by = None
+
+    return (
+        lastname, firstname, middlename, usn, program, year,
+        date_of_birth, password, profile_picture, approved_by
+    )
+
+# Insert students from a CSV reader in chunks, all inside one transaction.
+# Returns the USNs that were inserted and the number of rows skipped.
+# on_progress, if given, is called after every chunk with
+# (rows processed, inserted, skipped).
+def import_students(csv_reader, on_progress=None):
+    for column in STUDENT_CSV_COLUMNS:
+        if column not in (csv_reader.fieldnames or []):
+            raise KeyError(column)
+
+    inserted_usns = []
+    skipped = 0
+    processed = 0
+    seen = set()
+
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        while True:
+            chunk = list(itertools.islice(csv_reader, app.config['IMPORT_CHUNK_SIZE']))
+            if not chunk:
+                break
+            processed += len(chunk)
+
+            students = []
+            for row in chunk:
+                student = student_from_csv_row(row)
+                if student is None or student[3] in seen:
+                    skipped += 1
+                    continue
+                seen.add(student[3])
+                students.append(student)
+
+            if students:
+                usns = [student[3] for student in students]
+                placeholders = ', '.join('?' * len(usns))
+                existing = {row[0] for row in conn.execute(
+                    f"SELECT usn FROM students_tbl WHERE usn IN ({placeholders})", usns)}
+                new_students = [student for student in students if student[3] not in existing]
+                skipped += len(students) - len(new_students)
+
+                conn.executemany('''
+                    INSERT INTO students_tbl (
+                        lastname, firstname, middlename, usn, course, year,
+                        date_of_birth, password, profile_picture, approved_by
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', new_students)
+                inserted_usns.extend(student[3] for student in new_students)
+
+            if on_progress:
+                on_progress(processed, len(inserted_usns), skipped)
+
+        if inserted_usns:
+            bump_roster_version(conn, inserted_usns)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    for usn in inserted_usns:
+        invalidate_student_card(usn)
+
+    return inserted_usns, skipped
+
+IMPORT_JOB_FIELDS = ('rows_processed', 'inserted', 'skipped', 'qrcodes_done', 'qrcodes_total')
+
+_import_executor = ThreadPoolExecutor(max_workers=1)
+# Live counters for jobs running in this process; the table is only written
+# on state changes so the import transaction is not competing for the lock.
+_import_progress = {}
+_import_progress_lock = threading.Lock()
+
+def update_import_job(job_id, **fields):
+    with _import_progress_lock:
+        progress = _import_progress.get(job_id)
+        if progress is not None:
+            progress.update({key: value for key, value in fields.items() if key in IMPORT_JOB_FIELDS})
+
+def save_import_job(job_id, status, error=None):
+    with _import_progress_lock:
+        progress = dict(_import_progress.get(job_id, {}))
+
+    fields = {'status': status, 'error': error, **progress}
+    assignments = ', '.join(f"{field} = ?" for field in fields)
+    if status in ('done', 'failed'):
+        assignments += ", finished_at = datetime('now')"
+
+    conn = get_db_connection()
+    try:
+        conn.execute(f"UPDATE import_job_tbl SET {assignments} WHERE id = ?",
+                     list(fields.values()) + [job_id])
+        conn.commit()
+    finally:
+        conn.close()
+
+def run_import_job(job_id, path):
+    with _import_progress_lock:
+        _import_progress[job_id] = {field: 0 for field in IMPORT_JOB_FIELDS}
+
+    try:
+        save_import_job(job_id, 'running')
+        with open(path, encoding='utf-8-sig', newline='') as stream:
+            inserted_usns, skipped = import_students(
+                csv.DictReader(stream),
+                on_progress=lambda processed, inserted, skipped: update_import_job(
+                    job_id, rows_processed=processed, inserted=inserted, skipped=skipped)
+            )
+
+        update_import_job(job_id, qrcodes_total=len(inserted_usns))
+        save_import_job(job_id, 'generating_qrcodes')
+        generate_qr_codes(inserted_usns,
+                          on_progress=lambda done: update_import_job(job_id, qrcodes_done=done))
+        update_import_job(job_id, qrcodes_done=len(inserted_usns))
+        save_import_job(job_id, 'done')
+    except Exception as e:
+        save_import_job(job_id, 'failed', error=str(e))
+    finally:
+        with _import_progress_lock:
+            _import_progress.pop(job_id, None)
+        os.remove(path)
+
+def get_import_job(job_id):
+    conn = get_db_connection()
+    job = conn.execute("SELECT * FROM import_job_tbl WHERE id = ?", (job_id,)).fetchone()
+    conn.close()
+
+    if job is None:
+        return None
+
+    job = dict(job)
+    with _import_progress_lock:
+        job.update(_import_progress.get(job_id, {}))
+    return job
+
 # Upload CSV route
 @app.route('/upload-students', methods=['POST'])
 def upload_students():
@@ -829,97 +2516,481 @@ def upload_students():
     if not file.filename.endswith('.csv'):
         return jsonify({'error': 'Only CSV files are allowed'}), 400
 
-    stream = io.StringIO(file.stream.read().decode("utf-8-sig"), newline=None)
-    csv_reader = csv.DictReader(stream)
+    os.makedirs(app.config['IMPORT_FOLDER'], exist_ok=True)
+    path = os.path.join(app.config['IMPORT_FOLDER'], f"{uuid.uuid4().hex}.csv")
+    file.save(path)
 
-    inserted = 0
-    skipped = 0
-    qrcodes = []
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        fieldnames = csv.DictReader(stream).fieldnames or []
+    missing = [column for column in STUDENT_CSV_COLUMNS if column not in fieldnames]
+    if missing:
+        os.remove(path)
+        return jsonify({'error': f"Missing expected column: '{missing[0]}'"}), 400
 
-    for row in csv_reader:
-        try:
-            usn = row['USN'].strip()
-            lastname = row['LAST NAME'].strip()
-            firstname = row['FIRST NAME'].strip()
-            middlename = row['MIDDLE NAME'].strip()
-            program = row['PROGRAM'].strip()
-            year = row['YEAR'].strip()
-
-            password = usn[:4] + firstname.replace(" ", "").lower()
-            date_of_birth = "no data recorded"
-            profile_picture = "default_profile.jpg"
-            approved_by = None
-
-            student_data = (
-                lastname, firstname, middlename, usn, program, year,
-                date_of_birth, password, profile_picture, approved_by
-            )
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("INSERT INTO import_job_tbl (filename, status, created_at, created_by) VALUES (?, 'queued', datetime('now'), ?)",
+              (secure_filename(file.filename), session.get('admin_id')))
+    conn.commit()
+    job_id = c.lastrowid
+    conn.close()
 
-            if insert_student(student_data):
-                qr_path = generate_qr_code(usn)
-                qrcodes.append(qr_path)
-                inserted += 1
-            else:
-                skipped += 1
-        except KeyError as e:
-            return jsonify({'error': f'Missing expected column: {e}'}), 400
+    _import_executor.submit(run_import_job, job_id, path)
 
     return jsonify({
-        'status': 'Upload complete',
-        'inserted': inserted,
-        'skipped (possibly duplicates)': skipped,
-        'qrcodes_generated': qrcodes
-    })
+        'status': 'Upload queued',
+        'job_id': job_id,
+        'progress_url': url_for('upload_students_progress', job_id=job_id)
+    }), 202
+
+@app.route('/upload-students/<int:job_id>')
+def upload_students_progress(job_id):
+    job = get_import_job(job_id)
+
+    if job is None:
+        return jsonify({'error': 'Import job not found'}), 404
+
+    return jsonify(job)
 
 
+ATTENDANCE_EXPORT_QUERY = f"""
+    SELECT 
+        attendance_list_tbl.id,
+        attendance_list_tbl.activity_id,
+        students_tbl.usn AS student_usn,
+        students_tbl.firstname || ' ' || students_tbl.middlename || ' ' || students_tbl.lastname AS student_name,
+        event_type_tbl.event_name,
+        activity_tbl.activity_name,
+        {formatted_time_sql('attendance_list_tbl.time_in_at', 'attendance_list_tbl.time_in_date_and_time')},
+        {status_sql('attendance_list_tbl.time_in_status_id', 'attendance_list_tbl.time_in_status')},
+        {formatted_time_sql('attendance_list_tbl.time_out_at', 'attendance_list_tbl.time_out_date_and_time')},
+        {status_sql('attendance_list_tbl.time_out_status_id', 'attendance_list_tbl.time_out_status')}
+    FROM attendance_list_tbl
+    JOIN students_tbl ON attendance_list_tbl.student_usn = students_tbl.usn
+    JOIN activity_tbl ON attendance_list_tbl.activity_id = activity_tbl.id
+    JOIN event_type_tbl ON attendance_list_tbl.event_type = event_type_tbl.id
+"""
+
+# (column header, row key) pairs for attendance exports
+ATTENDANCE_EXPORT_COLUMNS = (
+    ('Student USN', 'student_usn'),
+    ('Student Name', 'student_name'),
+    ('Event Type', 'event_name'),
+    ('Activity Name', 'activity_name'),
+    ('Time In', 'time_in_date_and_time'),
+    ('Status (In)', 'time_in_status'),
+    ('Time Out', 'time_out_date_and_time'),
+    ('Status (Out)', 'time_out_status'),
+)
+
+EXPORT_FETCH_SIZE = 1000
+
+def iter_cursor(cursor):
+    while True:
+        rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+        if not rows:
+            break
+        yield from rows
+
+# Yield CSV text in chunks straight from the cursor
+def stream_attendance_csv(cursor):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _ in ATTENDANCE_EXPORT_COLUMNS])
+
+    while True:
+        rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+        if not rows:
+            break
+        writer.writerows([row[key] for _, key in ATTENDANCE_EXPORT_COLUMNS] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+    yield buffer.getvalue()
+
+def write_attendance_sheet(workbook, worksheet, rows):
+    header_format = workbook.add_format({'bold': True})
+    worksheet.write_row(0, 0, [header for header, _ in ATTENDANCE_EXPORT_COLUMNS], header_format)
+
+    row_count = 0
+    for row_count, row in enumerate(rows, start=1):
+        worksheet.write_row(row_count, 0, [row[key] for _, key in ATTENDANCE_EXPORT_COLUMNS])
+    return row_count
+
+# constant_memory flushes each row to disk as it is written, so memory use
+# does not grow with the number of attendees. The caller owns the returned file.
+def new_export_workbook():
+    output = tempfile.TemporaryFile()
+    return output, xlsxwriter.Workbook(output, {'constant_memory': True})
+
 @app.route('/download_excel/<int:event_type_id>/<int:activity_id>')
 def download_excel(event_type_id, activity_id):
-    conn = get_db_connection()
-    conn.row_factory = sqlite3.Row  # Enable dictionary-like row access
-    cursor = conn.cursor()
+    export_format = request.args.get('format', 'xlsx')
+    if export_format not in ('xlsx', 'csv'):
+        return jsonify({"error": "Unsupported export format"}), 400
 
-    # SQL query with necessary fields
-    cursor.execute("""
-        SELECT 
-            attendance_list_tbl.id,
-            students_tbl.usn AS student_usn,
-            students_tbl.firstname || ' ' || students_tbl.middlename || ' ' || students_tbl.lastname AS student_name,
-            event_type_tbl.event_name,
-            activity_tbl.activity_name,
-            attendance_list_tbl.time_in_date_and_time,
-            attendance_list_tbl.time_in_status,
-            attendance_list_tbl.time_out_date_and_time,
-            attendance_list_tbl.time_out_status
-        FROM attendance_list_tbl
-        JOIN students_tbl ON attendance_list_tbl.student_usn = students_tbl.usn
-        JOIN activity_tbl ON attendance_list_tbl.activity_id = activity_tbl.id
-        JOIN event_type_tbl ON attendance_list_tbl.event_type = event_type_tbl.id
+    query = ATTENDANCE_EXPORT_QUERY + """
         WHERE attendance_list_tbl.event_type = ? AND attendance_list_tbl.activity_id = ?
-    """, (event_type_id, activity_id))
+    """
+    params = [event_type_id, activity_id]
+
+    # Optional time-in range (?since=/&until=, ISO datetimes), served by the
+    # (activity_id, time_in_at) index
+    try:
+        since = epoch_seconds(request.args.get('since'))
+        until = epoch_seconds(request.args.get('until'))
+    except (ValueError, OverflowError):
+        return jsonify({"error": "Invalid since/until"}), 400
+    if since is not None:
+        query += " AND attendance_list_tbl.time_in_at >= ?"
+        params.append(since)
+    if until is not None:
+        query += " AND attendance_list_tbl.time_in_at < ?"
+        params.append(until)
+    download_name = f'attendance_{event_type_id}_{activity_id}.{export_format}'
+
+    if export_format == 'csv':
+        @stream_with_context
+        def generate():
+            conn = get_db_connection()
+            yield from stream_attendance_csv(conn.execute(attendance_query(conn, query, event_type_id), params))
+            conn.close()
+
+        return Response(generate(), mimetype='text/csv', headers={
+            'Content-Disposition': f'attachment; filename={download_name}'
+        })
+
+    conn = get_db_connection()
+    cursor = conn.execute(attendance_query(conn, query, event_type_id), params)
+
+    output, workbook = new_export_workbook()
+    write_attendance_sheet(workbook, workbook.add_worksheet('Attendance'), iter_cursor(cursor))
+    workbook.close()
+    conn.close()
+
+    output.seek(0)
+    return send_file(output, download_name=download_name, as_attachment=True,
+                     mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+TIME_IN_STATUSES = ("On Time", "15 mins late", "30 mins late", "LATE")
+
+# Excel sheet names are capped at 31 characters, must be unique and cannot
+# contain []:*?/\
+def excel_sheet_name(name, used):
+    base = ''.join('_' if ch in '[]:*?/\\' else ch for ch in name).strip() or 'Activity'
+    sheet_name = base[:31]
+    suffix = 2
+    while sheet_name.lower() in used:
+        tag = f" ({suffix})"
+        sheet_name = base[:31 - len(tag)] + tag
+        suffix += 1
+    used.add(sheet_name.lower())
+    return sheet_name
+
+@app.route('/download_excel/<int:event_type_id>')
+def download_event_excel(event_type_id):
+    export_format = request.args.get('format', 'xlsx')
+    if export_format not in ('xlsx', 'csv'):
+        return jsonify({"error": "Unsupported export format"}), 400
+
+    conn = get_db_connection()
+    activities = conn.execute("SELECT id, activity_name FROM activity_tbl WHERE event_type = ? ORDER BY id",
+                              (event_type_id,)).fetchall()
+    if not activities:
+        conn.close()
+        return jsonify({"error": "Event not found or has no activities"}), 404
+
+    query = ATTENDANCE_EXPORT_QUERY + """
+        WHERE attendance_list_tbl.event_type = ?
+        ORDER BY attendance_list_tbl.activity_id, attendance_list_tbl.id
+    """
+    params = (event_type_id,)
+    download_name = f'attendance_{event_type_id}.{export_format}'
+
+    if export_format == 'csv':
+        conn.close()
 
-    rows = cursor.fetchall()
+        @stream_with_context
+        def generate():
+            conn = get_db_connection()
+            yield from stream_attendance_csv(conn.execute(attendance_query(conn, query, event_type_id), params))
+            conn.close()
+
+        return Response(generate(), mimetype='text/csv', headers={
+            'Content-Disposition': f'attachment; filename={download_name}'
+        })
+
+    output, workbook = new_export_workbook()
+    # Added first so it is the first tab, filled in once every activity is written
+    summary = workbook.add_worksheet('Summary')
+
+    used_names = {'summary'}
+    sheets = {activity['id']: workbook.add_worksheet(excel_sheet_name(activity['activity_name'], used_names))
+              for activity in activities}
+    counts = {activity['id']: {} for activity in activities}
+
+    def count_statuses(activity_id, rows):
+        for row in rows:
+            status = row['time_in_status']
+            counts[activity_id][status] = counts[activity_id].get(status, 0) + 1
+            yield row
+
+    cursor = conn.execute(attendance_query(conn, query, event_type_id), params)
+    for activity_id, rows in itertools.groupby(iter_cursor(cursor), key=lambda row: row['activity_id']):
+        if activity_id in sheets:
+            write_attendance_sheet(workbook, sheets.pop(activity_id), count_statuses(activity_id, rows))
     conn.close()
 
-    # Convert results into dictionaries for DataFrame
-    students = [{
-        'Student USN': row['student_usn'],
-        'Student Name': row['student_name'],
-        'Event Type': row['event_name'],
-        'Activity Name': row['activity_name'],
-        'Time In': row['time_in_date_and_time'],
-        'Status (In)': row['time_in_status'],
-        'Time Out': row['time_out_date_and_time'],
-        'Status (Out)': row['time_out_status']
-    } for row in rows]
-
-    # Create Excel file in memory
-    df = pd.DataFrame(students)
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False, sheet_name='Attendance')
+    # Activities nobody attended still get a sheet with just the header
+    for worksheet in sheets.values():
+        write_attendance_sheet(workbook, worksheet, [])
+
+    statuses = list(TIME_IN_STATUSES)
+    statuses += sorted({status for activity_counts in counts.values() for status in activity_counts} - set(statuses))
 
+    header_format = workbook.add_format({'bold': True})
+    summary.write_row(0, 0, ['Activity Name'] + statuses + ['Total'], header_format)
+    for row_number, activity in enumerate(activities, start=1):
+        activity_counts = counts[activity['id']]
+        summary.write_row(row_number, 0, [activity['activity_name']]
+                          + [activity_counts.get(status, 0) for status in statuses]
+                          + [sum(activity_counts.values())])
+
+    workbook.close()
     output.seek(0)
-    return send_file(output, download_name=f'attendance_{event_type_id}_{activity_id}.xlsx', as_attachment=True)
+    return send_file(output, download_name=download_name, as_attachment=True,
+                     mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+ARCHIVE_COLUMNS = ('id, student_usn, event_type, activity_id, time_in_date_and_time, time_in_status, '
+                   'time_out_date_and_time, time_out_status, time_in_at, time_out_at, '
+                   'time_in_status_id, time_out_status_id')
+
+# attendance_list_tbl inside an archive file. No foreign keys: students,
+# activities and events stay in the hot database and are joined from there.
+ARCHIVE_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS {schema}.attendance_list_tbl (
+           id INTEGER PRIMARY KEY,
+           student_usn TEXT NOT NULL,
+           event_type INTEGER NOT NULL,
+           activity_id INTEGER NOT NULL,
+           time_in_date_and_time TEXT NOT NULL,
+           time_in_status TEXT NOT NULL,
+           time_out_date_and_time TEXT NOT NULL,
+           time_out_status TEXT NOT NULL,
+           time_in_at INTEGER,
+           time_out_at INTEGER,
+           time_in_status_id INTEGER,
+           time_out_status_id INTEGER
+       )''',
+    '''CREATE INDEX IF NOT EXISTS {schema}.idx_attendance_event_activity
+       ON attendance_list_tbl (event_type, activity_id)''',
+    '''CREATE INDEX IF NOT EXISTS {schema}.idx_attendance_activity_time_in
+       ON attendance_list_tbl (activity_id, time_in_at)''',
+]
+
+# Events whose every activity closed at least ARCHIVE_AFTER_DAYS ago
+ARCHIVABLE_EVENTS_QUERY = '''
+    SELECT e.id, e.event_name, MIN(a.start_at) AS start_at
+    FROM event_type_tbl e
+    JOIN activity_tbl a ON a.event_type = e.id
+    WHERE e.id NOT IN (SELECT event_id FROM archived_event_tbl)
+    GROUP BY e.id
+    HAVING COUNT(a.end_at) = COUNT(*) AND MAX(a.end_at) <= ?
+'''
+
+# Terms are half years ("2025_1" is January to June) unless given explicitly
+def archive_term(start_at):
+    started = time.localtime(start_at)
+    return f"{started.tm_year}_{1 if started.tm_mon <= 6 else 2}"
+
+def archive_schema(term):
+    schema = f"archive_{term}"
+    if not term or not term.isascii() or not schema.isidentifier():
+        raise ValueError(f"Invalid archive term: {term!r}")
+    return schema
+
+def archive_path(term):
+    return os.path.join(app.config['ARCHIVE_FOLDER'], f"{term}.db")
+
+# Attaches a term's archive file to conn and returns its schema name.
+# Attachments stay on the pooled connection, so only the first read of a term
+# pays for the ATTACH; past ARCHIVE_ATTACH_MAX terms they are all dropped.
+def attach_archive(conn, term):
+    schema = archive_schema(term)
+    attached = [row[1] for row in conn.execute("PRAGMA database_list") if row[1].startswith('archive_')]
+    if schema in attached:
+        return schema
+    if len(attached) >= app.config['ARCHIVE_ATTACH_MAX']:
+        for name in attached:
+            conn.execute(f"DETACH DATABASE {name}")
+    conn.execute(f"ATTACH DATABASE ? AS {schema}", (archive_path(term),))
+    increment_metric('attendance_archive_attach_total')
+    return schema
+
+# Points an attendance query at wherever the event's rows live. Archived
+# events read the attached copy, aliased so the attendance_list_tbl.column
+# references in the query keep working.
+def attendance_query(conn, query, event_id):
+    row = conn.execute("SELECT term FROM archived_event_tbl WHERE event_id = ?", (event_id,)).fetchone()
+    if row is None:
+        return query
+    return archived_query(query, attach_archive(conn, row[0]))
+
+def archived_query(query, schema):
+    return query.replace("FROM attendance_list_tbl",
+                         f"FROM {schema}.attendance_list_tbl AS attendance_list_tbl", 1)
+
+# Moves one event's attendance rows to its term's archive file. The copy is
+# committed to the archive first and keeps the row ids, so a run cut short
+# before the delete just copies the same rows again next time. Returns the
+# number of rows moved.
+def archive_event(event_id, term):
+    os.makedirs(app.config['ARCHIVE_FOLDER'], exist_ok=True)
+    conn = get_db_connection()
+    try:
+        schema = attach_archive(conn, term)
+        for statement in ARCHIVE_SCHEMA:
+            conn.execute(statement.format(schema=schema))
+        conn.execute(f'''INSERT OR REPLACE INTO {schema}.attendance_list_tbl ({ARCHIVE_COLUMNS})
+                         SELECT {ARCHIVE_COLUMNS} FROM main.attendance_list_tbl WHERE event_type = ?''',
+                     (event_id,))
+        conn.commit()
+
+        conn.execute("BEGIN IMMEDIATE")
+        moved = conn.execute(f'''DELETE FROM main.attendance_list_tbl
+                                  WHERE event_type = ? AND id IN (
+                                      SELECT id FROM {schema}.attendance_list_tbl WHERE event_type = ?
+                                  )''', (event_id, event_id)).rowcount
+        left = conn.execute("SELECT COUNT(*) FROM main.attendance_list_tbl WHERE event_type = ?",
+                            (event_id,)).fetchone()[0]
+        if left:
+            # A scan landed between the copy and the delete; leave the event hot
+            conn.rollback()
+            return None
+        conn.execute('''INSERT INTO archived_event_tbl (event_id, term, row_count, archived_at)
+                        VALUES (?, ?, ?, datetime('now'))''', (event_id, term, moved))
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return moved
+
+@app.cli.command('archive-events')
+@click.option('--days', type=int, default=None, help='Only events closed this many days ago (ARCHIVE_AFTER_DAYS).')
+@click.option('--term', default=None, help='Archive file name; defaults to the half year the event started in.')
+@click.option('--vacuum', is_flag=True, help='Shrink the hot database file afterwards.')
+def archive_events_command(days, term, vacuum):
+    """Move attendance rows of finished events into per-term archive files."""
+    days = app.config['ARCHIVE_AFTER_DAYS'] if days is None else days
+    if term is not None:
+        archive_schema(term)
+    # Open rows of ended activities are closed first so nothing is left to check out
+    auto_checkout()
+
+    cutoff = time.time() - app.config['SCAN_CLOSES_AFTER_END'] * 60 - days * 24 * 60 * 60
+    conn = get_db_connection()
+    events = conn.execute(ARCHIVABLE_EVENTS_QUERY, (cutoff,)).fetchall()
+    conn.close()
+
+    archived = 0
+    for event in events:
+        event_term = term or archive_term(event['start_at'])
+        moved = archive_event(event['id'], event_term)
+        if moved is None:
+            click.echo(f"Event {event['id']} ({event['event_name']}): still receiving scans, skipped")
+            continue
+        click.echo(f"Event {event['id']} ({event['event_name']}): {moved} rows moved to {archive_path(event_term)}")
+        archived += 1
+
+    if vacuum and archived:
+        conn = get_db_connection()
+        conn.execute("VACUUM main")
+        conn.close()
+    click.echo(f"{archived} events archived")
+
+# SQL run by the hot routes, checked by `flask check-query-plans`.
+# Each entry is (route, sql, sample parameters).
+QUERY_PLAN_CHECKS = [
+    ('verify_student', "SELECT * FROM students_tbl WHERE usn = ?", ('0',)),
+    ('roster', ROSTER_QUERY + " WHERE roster_version > ?", (1,)),
+    ('roster', ROSTER_QUERY + " WHERE roster_version > ? AND course = ?", (1, 'BSIT')),
+    ('submit_scan', SCAN_LOOKUP_QUERY, ('0', 1, 1)),
+    ('timeout_submit_scan', """SELECT time_out_status FROM attendance_list_tbl
+                               WHERE student_usn = ? AND activity_id = ? AND event_type = ?""", ('0', 1, 1)),
+    ('timeout_submit_scan', """UPDATE attendance_list_tbl
+                               SET time_out_date_and_time = ?, time_out_at = ?, time_out_status = ?, time_out_status_id = ?
+                               WHERE student_usn = ? AND activity_id = ? AND event_type = ?""",
+     ('', 0, '', 1, '0', 1, 1)),
+    ('auto_checkout', AUTO_CHECKOUT_QUERY, (0,)),
+    ('auto_checkout', """UPDATE attendance_list_tbl SET time_out_status = ?, time_out_status_id = ?, time_out_at = ?
+                         WHERE activity_id = ? AND time_out_status = 'Not Checked Out'""", ('', 1, 0, 1)),
+    ('status_id', "SELECT id FROM attendance_status_tbl WHERE status = ?", ('',)),
+    ('view_event', "SELECT * FROM activity_tbl WHERE event_type = ?", (1,)),
+    ('activity_stats', "SELECT status_type, status, total FROM attendance_stats_tbl WHERE activity_id = ?", (1,)),
+    ('admin_students_page', "SELECT usn, lastname, firstname, middlename, course, year FROM students_tbl"
+                            " WHERE usn > ? ORDER BY usn LIMIT ?", ('', 51)),
+    ('admin_activities_page', "SELECT a.id, e.event_name FROM activity_tbl a JOIN event_type_tbl e ON a.event_type = e.id"
+                              " WHERE a.id > ? ORDER BY a.id LIMIT ?", (0, 51)),
+    ('view_students', ATTENDANCE_LIST_QUERY, (1, 1)),
+    ('view_students', ATTENDANCE_LIST_QUERY + " AND students_tbl.year = ?", (1, 1, '1')),
+    ('multithreads_page', "SELECT * FROM event_type_tbl WHERE event_type = 'Multithreads'", ()),
+    ('download_excel', ATTENDANCE_EXPORT_QUERY + """
+        WHERE attendance_list_tbl.event_type = ? AND attendance_list_tbl.activity_id = ?""", (1, 1)),
+    ('download_excel', ATTENDANCE_EXPORT_QUERY + """
+        WHERE attendance_list_tbl.event_type = ? AND attendance_list_tbl.activity_id = ?
+        AND attendance_list_tbl.time_in_at >= ? AND attendance_list_tbl.time_in_at < ?""", (1, 1, 0, 1)),
+    ('download_event_excel', ATTENDANCE_EXPORT_QUERY + """
+        WHERE attendance_list_tbl.event_type = ?
+        ORDER BY attendance_list_tbl.activity_id, attendance_list_tbl.id""", (1,)),
+    ('attendance_query', "SELECT term FROM archived_event_tbl WHERE event_id = ?", (1,)),
+    ('view_students', archived_query(ATTENDANCE_LIST_QUERY, 'archive_plan'), (1, 1)),
+    ('download_excel', archived_query(ATTENDANCE_EXPORT_QUERY, 'archive_plan') + """
+        WHERE attendance_list_tbl.event_type = ? AND attendance_list_tbl.activity_id = ?
+        AND attendance_list_tbl.time_in_at >= ? AND attendance_list_tbl.time_in_at < ?""", (1, 1, 0, 1)),
+    ('download_event_excel', archived_query(ATTENDANCE_EXPORT_QUERY, 'archive_plan') + """
+        WHERE attendance_list_tbl.event_type = ?
+        ORDER BY attendance_list_tbl.activity_id, attendance_list_tbl.id""", (1,)),
+]
+
+# Returns (route, plan detail) for every step that reads a whole table or
+# index, or needs a temporary b-tree to sort. Plans are taken against an
+# empty copy of the schema so they do not depend on how much data is loaded.
+def find_query_plan_regressions(conn):
+    schema = conn.execute('''SELECT sql FROM sqlite_master
+                             WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+                             ORDER BY type = 'index' ''').fetchall()
+    plan_conn = sqlite3.connect(':memory:')
+    for row in schema:
+        plan_conn.execute(row[0])
+    # Reads of archived events go through an attached archive file
+    plan_conn.execute("ATTACH DATABASE ':memory:' AS archive_plan")
+    for statement in ARCHIVE_SCHEMA:
+        plan_conn.execute(statement.format(schema='archive_plan'))
+
+    regressions = []
+    for route, sql, params in QUERY_PLAN_CHECKS:
+        for row in plan_conn.execute("EXPLAIN QUERY PLAN " + sql, params):
+            detail = row[3]
+            if detail.startswith('SCAN') or 'TEMP B-TREE' in detail:
+                regressions.append((route, detail))
+    plan_conn.close()
+    return regressions
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if any hot route query falls back to a full table scan."""
+    conn = get_db_connection()
+    regressions = find_query_plan_regressions(conn)
+    conn.close()
+
+    for route, detail in regressions:
+        click.echo(f"{route}: {detail}", err=True)
+    if regressions:
+        raise SystemExit(1)
+    click.echo(f"{len(QUERY_PLAN_CHECKS)} queries checked, no full table scans.")
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
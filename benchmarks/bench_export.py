@@ -0,0 +1,73 @@
+"""Peak memory benchmark for /download_excel.
+
+Each row count runs in a fresh subprocess against a throwaway database so
+that ru_maxrss reflects a single export.
+
+    python benchmarks/bench_export.py --rows 1000 10000 100000 --format xlsx
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import REPO_ROOT, database_path, load_app
+
+
+def seed(db_path, rows):
+    import sqlite3
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO admin_tbl (lastname, firstname, middlename, password) VALUES ('Bench', 'Bench', '', 'bench')")
+    conn.execute("INSERT INTO event_type_tbl (event_name, event_type, date_created, created_by) VALUES ('Bench Event', 'Multithreads', datetime('now'), 1)")
+    conn.execute("INSERT INTO activity_tbl (event_type, activity_name, start_datetime, end_datetime, created_by) VALUES (1, 'Bench Activity', '2025-04-14T08:00', '2025-04-14T17:00', 1)")
+    conn.executemany(
+        "INSERT INTO students_tbl (lastname, firstname, middlename, usn, course, year, date_of_birth, password, profile_picture) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        ((f"Lastname{i}", f"Firstname{i}", "Middle", f"9{i:010d}", "BSIT", "1", "no data recorded", "bench", "default_profile.jpg")
+         for i in range(rows))
+    )
+    conn.executemany(
+        "INSERT INTO attendance_list_tbl (student_usn, event_type, activity_id, time_in_date_and_time, time_in_status, time_out_date_and_time, time_out_status) VALUES (?, 1, 1, '2025-04-14 07:55:00', 'On Time', '2025-04-14 17:01:00', 'Checked Out')",
+        ((f"9{i:010d}",) for i in range(rows))
+    )
+    conn.commit()
+    conn.close()
+
+
+def run_once(rows, export_format):
+    with tempfile.TemporaryDirectory() as workdir:
+        app_module = load_app(workdir)
+        seed(database_path(workdir), rows)
+
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        client = app_module.app.test_client()
+        start = time.perf_counter()
+        response = client.get(f'/download_excel/1/1?format={export_format}')
+        size = sum(len(chunk) for chunk in response.response)
+        elapsed = time.perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        os.chdir(REPO_ROOT)
+
+    print(f"{rows:>8} rows  {export_format:<4}  {size / 1024:9.0f} KiB  {elapsed:6.2f} s  "
+          f"peak RSS {peak / 1024:7.1f} MiB  (+{(peak - baseline) / 1024:.1f} MiB during export)")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 50000])
+    arg_parser.add_argument('--format', choices=('xlsx', 'csv'), default='xlsx')
+    arg_parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.single:
+        run_once(args.rows[0], args.format)
+        return
+
+    for rows in args.rows:
+        subprocess.run([sys.executable, __file__, '--single', '--rows', str(rows), '--format', args.format],
+                       check=True)
+
+
+if __name__ == '__main__':
+    main()
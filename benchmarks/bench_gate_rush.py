@@ -0,0 +1,176 @@
+"""Gate-rush load test: many scanners checking students in and out at once.
+
+Seeds a throwaway database with students, events and activities, then
+drives /verify_student + /submit_scan for every student from --scanners
+concurrent threads, followed by the same rush on /timeout_submit_scan.
+Requests go through a local threaded WSGI server (--mode server, the
+default) or straight through Flask's test client (--mode client).
+
+With --contended N the rushes are replaced by N requests per scanner,
+each a time-in or time-out for a random student at the same gate, so
+scanners keep writing the same rows.
+
+Reports scans per second, p50/p99 latency per step and how many requests
+failed, with "database is locked" errors counted separately.
+
+    python benchmarks/bench_gate_rush.py --students 2000 --scanners 16
+    python benchmarks/bench_gate_rush.py --students 60 --scanners 8 --contended 150 --mode client
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from common import REPO_ROOT, database_path, load_app, percentile, seed_gates
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.failures = Counter()
+
+    def add(self, step, elapsed, ok):
+        with self.lock:
+            self.latencies.setdefault(step, []).append(elapsed)
+            if not ok:
+                self.failures[step] += 1
+
+
+def make_poster(app_module, mode, base_url):
+    if mode == 'client':
+        client = app_module.app.test_client()
+
+        def post(path, data):
+            return client.post(path, data=data).status_code
+    else:
+        import requests
+        http = requests.Session()
+
+        def post(path, data):
+            return http.post(base_url + path, data=data).status_code
+    return post
+
+
+def rush(app_module, args, base_url, usns, gates, recorder, timeout_phase):
+    # Students are dealt round-robin to scanners; each scanner sits at one gate
+    def scanner(index):
+        post = make_poster(app_module, args.mode, base_url)
+        event_id, activity_id = gates[index % len(gates)]
+        for usn in usns[index::args.scanners]:
+            if timeout_phase:
+                steps = [('timeout_submit_scan', f'/timeout_submit_scan/{event_id}',
+                          {'usn': usn, 'activity_id': activity_id})]
+            else:
+                steps = [('verify_student', '/verify_student', {'usn': usn}),
+                         ('submit_scan', f'/submit_scan/{event_id}', {'usn': usn, 'activity_id': activity_id})]
+            for step, path, data in steps:
+                start = time.perf_counter()
+                status = post(path, data)
+                recorder.add(step, time.perf_counter() - start, status == 200)
+
+    return run_scanners(args, scanner)
+
+
+def contended_rush(app_module, args, base_url, usns, gates, recorder):
+    # Every scanner draws from the whole roster at one gate
+    event_id, activity_id = gates[0]
+
+    def scanner(index):
+        post = make_poster(app_module, args.mode, base_url)
+        rng = random.Random(index)
+        for _ in range(args.contended):
+            step = rng.choice(('submit_scan', 'timeout_submit_scan'))
+            start = time.perf_counter()
+            status = post(f'/{step}/{event_id}', {'usn': rng.choice(usns), 'activity_id': activity_id})
+            recorder.add(step, time.perf_counter() - start, status == 200)
+
+    return run_scanners(args, scanner)
+
+
+def run_scanners(args, scanner):
+    threads = [threading.Thread(target=scanner, args=(i,)) for i in range(args.scanners)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--students', type=int, default=2000)
+    arg_parser.add_argument('--events', type=int, default=1)
+    arg_parser.add_argument('--activities', type=int, default=2)
+    arg_parser.add_argument('--scanners', type=int, default=16)
+    arg_parser.add_argument('--mode', choices=('server', 'client'), default='server')
+    arg_parser.add_argument('--contended', type=int, default=0, metavar='N',
+                            help='Send N mixed requests per scanner over shared students instead of the rushes.')
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app_module = load_app(workdir)
+        usns, gates = seed_gates(database_path(workdir), args.students, args.events, args.activities)
+
+        # Count unhandled errors by type, whichever way requests come in
+        from flask import got_request_exception
+        errors = Counter()
+
+        def on_exception(sender, exception, **extra):
+            if isinstance(exception, sqlite3.OperationalError) and 'locked' in str(exception):
+                errors['database is locked'] += 1
+            else:
+                errors[type(exception).__name__] += 1
+        got_request_exception.connect(on_exception, app_module.app)
+        # They are counted above; a traceback each would bury the report
+        app_module.app.logger.disabled = True
+
+        server = None
+        base_url = None
+        if args.mode == 'server':
+            from werkzeug.serving import WSGIRequestHandler, make_server
+
+            class QuietHandler(WSGIRequestHandler):
+                def log_request(self, *args):
+                    pass
+
+            server = make_server('127.0.0.1', 0, app_module.app, threaded=True, request_handler=QuietHandler)
+            base_url = f'http://127.0.0.1:{server.server_port}'
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        recorder = Recorder()
+        if args.contended:
+            contended_seconds = contended_rush(app_module, args, base_url, usns, gates, recorder)
+        else:
+            time_in_seconds = rush(app_module, args, base_url, usns, gates, recorder, timeout_phase=False)
+            time_out_seconds = rush(app_module, args, base_url, usns, gates, recorder, timeout_phase=True)
+
+        if server is not None:
+            server.shutdown()
+
+        print(f"{len(usns)} students, {len(gates)} gates, {args.scanners} scanners, mode={args.mode}")
+        if args.contended:
+            requests = args.contended * args.scanners
+            print(f"contended      {requests / contended_seconds:8.1f} scans/s  ({contended_seconds:.2f} s)")
+        else:
+            print(f"time-in rush   {len(usns) / time_in_seconds:8.1f} scans/s  ({time_in_seconds:.2f} s)")
+            print(f"time-out rush  {len(usns) / time_out_seconds:8.1f} scans/s  ({time_out_seconds:.2f} s)")
+        for step, samples in recorder.latencies.items():
+            ms = [s * 1000 for s in samples]
+            print(f"{step:<20} n={len(ms):<6} p50={percentile(ms, 50):7.2f} ms  p99={percentile(ms, 99):7.2f} ms  "
+                  f"mean={statistics.mean(ms):7.2f} ms  failed={recorder.failures[step]}")
+        print(f"lock-contention errors: {errors['database is locked']}")
+        for name, count in errors.items():
+            if name != 'database is locked':
+                print(f"other errors ({name}): {count}")
+        os.chdir(REPO_ROOT)
+
+
+if __name__ == '__main__':
+    main()
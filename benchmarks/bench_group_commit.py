@@ -0,0 +1,87 @@
+"""Group-commit benchmark: per-request commits vs the scan writer thread.
+
+Each configuration runs in a fresh subprocess against a throwaway database.
+--scanners threads post /submit_scan for every student through the Flask
+test client; the report shows scans per second next to commits per second,
+so the batching effect is visible for each durability level.
+
+    python benchmarks/bench_group_commit.py --students 2000 --scanners 32
+"""
+import argparse
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from common import REPO_ROOT, database_path, load_app, seed_gates
+
+
+def run_once(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        app_module = load_app(workdir)
+        usns, _ = seed_gates(database_path(workdir), args.students)
+
+        app_module.app.config['SCAN_WRITER_ENABLED'] = args.writer
+        app_module.app.config['DB_SYNCHRONOUS'] = args.synchronous
+        app_module.app.config['SCAN_WRITER_SYNCHRONOUS'] = args.synchronous
+        # Connections already in the pool were opened with the default level
+        while not app_module._db_pool.empty():
+            sqlite3.Connection.close(app_module._db_pool.get_nowait())
+
+        failures = []
+
+        def scanner(index):
+            client = app_module.app.test_client()
+            for usn in usns[index::args.scanners]:
+                response = client.post('/submit_scan/1', data={'usn': usn, 'activity_id': '1'})
+                if response.status_code != 200:
+                    failures.append(response.status_code)
+
+        threads = [threading.Thread(target=scanner, args=(i,)) for i in range(args.scanners)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        if args.writer:
+            commits = app_module._counters[('attendance_scan_writer_commits_total', ())]
+        else:
+            commits = len(usns) - len(failures)
+        os.chdir(REPO_ROOT)
+
+    mode = 'writer' if args.writer else 'direct'
+    print(f"{mode:<7} synchronous={args.synchronous:<7} {len(usns) / elapsed:8.1f} scans/s  "
+          f"{commits / elapsed:8.1f} commits/s  {len(usns) / max(commits, 1):6.1f} scans/commit  "
+          f"failed={len(failures)}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--students', type=int, default=2000)
+    arg_parser.add_argument('--scanners', type=int, default=32)
+    arg_parser.add_argument('--synchronous', nargs='+', default=['NORMAL', 'FULL'])
+    arg_parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS)
+    arg_parser.add_argument('--writer', action='store_true', help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.single:
+        args.synchronous = args.synchronous[0]
+        run_once(args)
+        return
+
+    for synchronous in args.synchronous:
+        for writer in (False, True):
+            command = [sys.executable, __file__, '--single', '--students', str(args.students),
+                       '--scanners', str(args.scanners), '--synchronous', synchronous]
+            if writer:
+                command.append('--writer')
+            subprocess.run(command, check=True)
+
+
+if __name__ == '__main__':
+    main()
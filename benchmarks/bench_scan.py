@@ -0,0 +1,57 @@
+"""Scan latency benchmark for /submit_scan.
+
+Runs the app against a throwaway database in a temporary directory and
+prints p50/p99 latency for first scans (insert) and re-scans, which keep
+the original time-in. Re-scans bypass the debounce window unless
+--debounce is given, so they measure the database path.
+
+    python benchmarks/bench_scan.py --students 500 --rescans 2
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from common import REPO_ROOT, database_path, load_app, percentile, seed_gates
+
+
+def report(label, samples):
+    ms = [s * 1000 for s in samples]
+    print(f"{label:<10} n={len(ms):<6} p50={percentile(ms, 50):7.2f} ms  "
+          f"p99={percentile(ms, 99):7.2f} ms  mean={statistics.mean(ms):7.2f} ms")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--students', type=int, default=500)
+    arg_parser.add_argument('--rescans', type=int, default=2)
+    arg_parser.add_argument('--debounce', action='store_true', help='Keep the scan debounce window on.')
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app_module = load_app(workdir)
+        usns, _ = seed_gates(database_path(workdir), args.students)
+        if not args.debounce:
+            app_module.app.config['SCAN_DEBOUNCE_SECONDS'] = 0
+        client = app_module.app.test_client()
+
+        def scan(usn):
+            start = time.perf_counter()
+            response = client.post('/submit_scan/1', data={'usn': usn, 'activity_id': '1'})
+            elapsed = time.perf_counter() - start
+            assert response.status_code == 200, response.get_data(as_text=True)
+            return elapsed
+
+        first = [scan(usn) for usn in usns]
+        again = [scan(usn) for _ in range(args.rescans) for usn in usns]
+
+        report('insert', first)
+        if again:
+            report('rescan', again)
+        report('all', first + again)
+        os.chdir(REPO_ROOT)
+
+
+if __name__ == '__main__':
+    main()
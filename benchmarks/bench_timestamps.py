@@ -0,0 +1,97 @@
+"""Range-query benchmark: TEXT datetimes vs epoch columns.
+
+Seeds a throwaway database, then times the same time-in range count and
+average stay duration against the legacy TEXT columns and against
+time_in_at / time_out_at.
+
+    python benchmarks/bench_timestamps.py --rows 200000 --activities 20
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from common import REPO_ROOT, database_path, load_app
+
+DAY = 24 * 60 * 60
+FIRST_DAY = 1744588800  # 2025-04-14 00:00 UTC
+
+QUERIES = [
+    ('range text', """SELECT COUNT(*) FROM attendance_list_tbl
+                      WHERE activity_id = ? AND datetime(time_in_date_and_time) >= datetime(?, 'unixepoch', 'localtime')
+                      AND datetime(time_in_date_and_time) < datetime(?, 'unixepoch', 'localtime')"""),
+    ('range epoch', """SELECT COUNT(*) FROM attendance_list_tbl
+                       WHERE activity_id = ? AND time_in_at >= ? AND time_in_at < ?"""),
+    ('stay text', """SELECT AVG(julianday(time_out_date_and_time) - julianday(time_in_date_and_time)) * 86400
+                     FROM attendance_list_tbl
+                     WHERE activity_id = ? AND time_out_status != 'Not Checked Out'
+                     AND datetime(time_in_date_and_time) >= datetime(?, 'unixepoch', 'localtime')
+                     AND datetime(time_in_date_and_time) < datetime(?, 'unixepoch', 'localtime')"""),
+    ('stay epoch', """SELECT AVG(time_out_at - time_in_at) FROM attendance_list_tbl
+                      WHERE activity_id = ? AND time_out_at IS NOT NULL
+                      AND time_in_at >= ? AND time_in_at < ?"""),
+]
+
+
+def seed(db_path, rows, activities):
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO admin_tbl (lastname, firstname, middlename, password) VALUES ('Bench', 'Bench', '', 'bench')")
+    conn.execute("INSERT INTO event_type_tbl (event_name, event_type, date_created, created_by) VALUES ('Bench Event', 'Multithreads', datetime('now'), 1)")
+    conn.executemany(
+        "INSERT INTO activity_tbl (event_type, activity_name, start_datetime, end_datetime, created_by) VALUES (1, ?, '2025-04-14T08:00', '2025-04-14T17:00', 1)",
+        ((f"Bench Activity {i}",) for i in range(activities))
+    )
+    conn.executemany(
+        "INSERT INTO students_tbl (lastname, firstname, middlename, usn, course, year, date_of_birth, password, profile_picture) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (("Student", f"Bench{i}", "", f"9{i:010d}", "BSIT", "1", "no data recorded", "bench", "default_profile.jpg")
+         for i in range(rows))
+    )
+
+    rng = random.Random(0)
+
+    def attendance():
+        for i in range(rows):
+            time_in = FIRST_DAY + rng.randrange(30 * DAY)
+            time_out = time_in + rng.randrange(8 * 60 * 60)
+            yield (f"9{i:010d}", i % activities + 1,
+                   time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time_in)), time_in,
+                   time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time_out)), time_out)
+
+    conn.executemany(
+        "INSERT INTO attendance_list_tbl (student_usn, event_type, activity_id, time_in_date_and_time, time_in_at, time_in_status, time_out_date_and_time, time_out_at, time_out_status) VALUES (?, 1, ?, ?, ?, 'On Time', ?, ?, 'Checked Out')",
+        attendance()
+    )
+    conn.commit()
+    conn.close()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--rows', type=int, default=200000)
+    arg_parser.add_argument('--activities', type=int, default=20)
+    arg_parser.add_argument('--repeat', type=int, default=20)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        load_app(workdir)
+        db_path = database_path(workdir)
+        seed(db_path, args.rows, args.activities)
+
+        conn = sqlite3.connect(db_path)
+        # One week of one activity
+        params = (1, FIRST_DAY + 7 * DAY, FIRST_DAY + 14 * DAY)
+        for label, sql in QUERIES:
+            plan = ' / '.join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                result = conn.execute(sql, params).fetchone()[0]
+            elapsed = (time.perf_counter() - start) / args.repeat
+            print(f"{label:<12} {elapsed * 1000:8.2f} ms  result={result!r:<22} {plan}")
+        conn.close()
+        os.chdir(REPO_ROOT)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Helpers shared by the benchmark scripts.
+
+Each script runs the app against a throwaway database: load_app() imports
+app.py from inside a temporary directory, which creates and migrates an
+empty database/database.db there, and the seed helpers fill it.
+"""
+import os
+import sqlite3
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app(workdir):
+    # app.py resolves database/ and static/ relative to the working directory
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_ROOT)
+    import app as app_module
+    return app_module
+
+
+def database_path(workdir):
+    return os.path.join(workdir, 'database', 'database.db')
+
+
+def bench_usn(i):
+    return f"9{i:010d}"
+
+
+def seed_students(conn, students):
+    conn.executemany(
+        "INSERT INTO students_tbl (lastname, firstname, middlename, usn, course, year, date_of_birth, password, profile_picture) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (("Student", f"Bench{i}", "", bench_usn(i), "BSIT", "1", "no data recorded", "bench", "default_profile.jpg")
+         for i in range(students))
+    )
+    return [bench_usn(i) for i in range(students)]
+
+
+def seed_gates(db_path, students, events=1, activities=1):
+    """Seed an admin, events with activities open around now, and students.
+
+    Returns the student USNs and one (event_id, activity_id) pair per activity.
+    """
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO admin_tbl (lastname, firstname, middlename, password) VALUES ('Bench', 'Bench', '', 'bench')")
+    gates = []
+    for event in range(events):
+        cursor = conn.execute("INSERT INTO event_type_tbl (event_name, event_type, date_created, created_by) VALUES (?, 'Multithreads', datetime('now'), 1)",
+                              (f"Bench Event {event}",))
+        event_id = cursor.lastrowid
+        for activity in range(activities):
+            # Open around now so scans fall inside the activity window
+            cursor = conn.execute(
+                "INSERT INTO activity_tbl (event_type, activity_name, start_datetime, end_datetime, created_by) "
+                "VALUES (?, ?, strftime('%Y-%m-%dT%H:%M', 'now', 'localtime', '-10 minutes'), "
+                "strftime('%Y-%m-%dT%H:%M', 'now', 'localtime', '+1 day'), 1)",
+                (event_id, f"Bench Activity {event}-{activity}"))
+            gates.append((event_id, cursor.lastrowid))
+    usns = seed_students(conn, students)
+    conn.commit()
+    conn.close()
+    return usns, gates
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
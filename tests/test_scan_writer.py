@@ -0,0 +1,58 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def app_module(tmp_path_factory):
+    # app.py creates and migrates database/database.db relative to the working directory
+    workdir = tmp_path_factory.mktemp('app')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_ROOT)
+    try:
+        import app as app_module
+        yield app_module
+    finally:
+        os.chdir(cwd)
+        sys.path.remove(REPO_ROOT)
+
+
+@pytest.fixture(scope='module')
+def gate(app_module):
+    conn = sqlite3.connect(app_module.app.config['DATABASE'])
+    conn.execute("INSERT INTO admin_tbl (lastname, firstname, middlename, password) VALUES ('Test', 'Test', '', 'test')")
+    event_id = conn.execute("INSERT INTO event_type_tbl (event_name, event_type, date_created, created_by) "
+                            "VALUES ('Test Event', 'Multithreads', datetime('now'), 1)").lastrowid
+    activity_id = conn.execute(
+        "INSERT INTO activity_tbl (event_type, activity_name, start_datetime, end_datetime, created_by) "
+        "VALUES (?, 'Test Activity', strftime('%Y-%m-%dT%H:%M', 'now', 'localtime', '-10 minutes'), "
+        "strftime('%Y-%m-%dT%H:%M', 'now', 'localtime', '+1 day'), 1)",
+        (event_id,)).lastrowid
+    conn.execute("INSERT INTO students_tbl (lastname, firstname, middlename, usn, course, year, date_of_birth, password, profile_picture) "
+                 "VALUES ('Student', 'Test', '', '90000000001', 'BSIT', '1', 'no data recorded', 'test', 'default_profile.jpg')")
+    conn.commit()
+    conn.close()
+    return event_id, activity_id
+
+
+# A time-out with no time-in fails in SQLite; the scan writer must answer it
+# the way the direct write path does rather than as a 409
+def test_failed_scan_matches_direct_path(app_module, gate, monkeypatch):
+    event_id, activity_id = gate
+    client = app_module.app.test_client()
+    data = {'usn': '90000000001', 'activity_id': activity_id}
+
+    responses = []
+    for enabled in (False, True):
+        monkeypatch.setitem(app_module.app.config, 'SCAN_WRITER_ENABLED', enabled)
+        responses.append(client.post(f'/timeout_submit_scan/{event_id}', data=data))
+
+    direct, writer = responses
+    assert direct.status_code == 500
+    assert writer.status_code == direct.status_code
+    assert writer.get_data() == direct.get_data()